@@ -0,0 +1,444 @@
+"""Benchmarks django-migration-docs on a synthetic project
+
+Generates a project with many apps and migrations in a temporary directory,
+configures Django to use it with a local SQLite database, and times the
+core operations of django-migration-docs, along with micro-benchmarks of
+looking up attributes of migrations. Run it with::
+
+    python benchmarks/benchmark.py --apps 50 --migrations 20
+
+Pass ``--check`` to fail when any benchmark exceeds its regression
+threshold or scales worse than linearly. Thresholds are a small multiple
+of the times measured on a plain Linux box and scale with the number of
+migrations in the project. Since thresholds scale linearly, ``--check``
+also runs the benchmarks on a project with twice the apps and the same
+number of stale docs, and fails when a benchmark takes more than
+``MAX_GROWTH`` times as long.
+"""
+
+import argparse
+import gc
+import json
+import os
+import pathlib
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+# Seconds allowed per 1,000 migrations before a benchmark is a regression.
+# About twice the times measured with the default arguments
+THRESHOLDS = {
+    "Migrations()": 1.5,
+    "check": 0.5,
+    "check --fast": 0.5,
+    "sync": 40,
+    "sync (warm SQL cache)": 2,
+    "show (grouped)": 1,
+    "MigrationDocs load (cold)": 0.5,
+    "MigrationDocs load (warm)": 0.1,
+    "MigrationDocs save": 1.5,
+    "Migration.label": 0.1,
+    "Migration docs attribute": 0.5,
+    "Migration schema default": 0.6,
+}
+
+# The most that a benchmark may slow down on a project with twice the apps.
+# Linear benchmarks take about twice as long and quadratic ones four times
+MAX_GROWTH = 3
+
+# Benchmarks faster than this many seconds are too noisy to compare growth.
+# Growth is measured from at least this time
+MIN_GROWTH_TIME = 0.1
+
+# Benchmarks whose growth isn't compared. Every attribute access takes
+# constant time, but how long depends on how much of the project fits in CPU
+# caches, so their growth varies too much between runs
+CONSTANT_TIME_BENCHMARKS = {
+    "Migration.label",
+    "Migration docs attribute",
+    "Migration schema default",
+}
+
+# The docs of generated migrations have every attribute of the schema except
+# for "type", so that looking it up falls back to the schema default
+SCHEMA = [
+    {"label": "point_of_contact", "help": "The point of contact for this migration."},
+    {"label": "description", "help": "An in-depth description of the migration."},
+    {"label": "type", "help": "When the migration is executed in deployment."},
+]
+
+# The number of times every migration's attribute is accessed in the
+# attribute access benchmarks
+ATTRIBUTE_ACCESSES = 100
+
+SHOW_TEMPLATE = """
+{% set groups = migrations.group("app_label", ascending_keys=True) %}
+{% for app_label, app_migrations in groups.items() %}
+# {{ app_label }}
+{% for migration in app_migrations %}
+[{% if migration.applied %}X{% else %} {% endif %}] {{ migration.label }}
+    {{ migration.point_of_contact }}: {{ migration.description|truncate(40) }}
+{% endfor %}
+{% endfor %}
+""".lstrip()
+
+
+def _app_label(app):
+    return f"bench_app_{app:04d}"
+
+
+def _migration_name(number):
+    return f"{number + 1:04d}_auto"
+
+
+def _migration_source(app, number, *, migrations, operations, dependencies):
+    """The source of a migration that creates a model and adds fields to it"""
+    app_label = _app_label(app)
+    deps = [(app_label, _migration_name(number - 1))] if number else []
+    if number == 0:
+        deps += [(_app_label(dep), _migration_name(migrations - 1)) for dep in dependencies]
+
+    model = f"Model{number}"
+    lines = [
+        "from django.db import migrations, models",
+        "",
+        "",
+        "class Migration(migrations.Migration):",
+        f"    dependencies = {deps!r}",
+        "",
+        "    operations = [",
+        "        migrations.CreateModel(",
+        f'            name="{model}",',
+        '            fields=[("id", models.AutoField(primary_key=True))],',
+        "        ),",
+    ]
+    for field in range(operations - 1):
+        lines += [
+            "        migrations.AddField(",
+            f'            model_name="{model.lower()}",',
+            f'            name="field_{field}",',
+            '            field=models.CharField(max_length=100, default=""),',
+            "        ),",
+        ]
+    lines += ["    ]", ""]
+
+    return "\n".join(lines)
+
+
+def generate_project(
+    root, *, apps, migrations, operations, dependencies, docs_size, stale, seed=0
+):
+    """Generate a synthetic project with migration docs in a directory
+
+    Args:
+        root (pathlib.Path): The directory of the project.
+        apps (int): The number of apps.
+        migrations (int): The number of migrations per app.
+        operations (int): The number of operations per migration.
+        dependencies (int): The number of earlier apps that the first
+            migration of every app depends on.
+        docs_size (int): The number of characters in the description of
+            every migration.
+        stale (float): The fraction of migration docs with stale hashes.
+        seed (int): The seed for choosing dependencies and stale docs.
+
+    Returns:
+        List[str]: The app labels of the project.
+    """
+    from migration_docs import core
+
+    rand = random.Random(seed)
+    app_labels = []
+    docs = {}
+    for app in range(apps):
+        app_label = _app_label(app)
+        app_labels.append(app_label)
+        migrations_dir = root / app_label / "migrations"
+        migrations_dir.mkdir(parents=True)
+        (root / app_label / "__init__.py").write_text("")
+        (migrations_dir / "__init__.py").write_text("")
+
+        app_dependencies = rand.sample(range(app), min(app, dependencies))
+        for number in range(migrations):
+            source = _migration_source(
+                app,
+                number,
+                migrations=migrations,
+                operations=operations,
+                dependencies=app_dependencies,
+            )
+            (migrations_dir / f"{_migration_name(number)}.py").write_text(source)
+            docs[f"{app_label}.{_migration_name(number)}"] = {
+                "_hash": "stale" if rand.random() < stale else core._hash_source(source),
+                "atomic": True,
+                "sql": "",
+                "point_of_contact": "benchmark",
+                "description": "x" * docs_size,
+            }
+
+    docs_root = root / ".migration-docs"
+    docs_root.mkdir()
+    (docs_root / "docs.yaml").write_text(yaml.dump(docs, Dumper=core._DocsDumper))
+    (docs_root / "migration.yaml").write_text(yaml.dump(SCHEMA))
+    (docs_root / "show_grouped.tpl").write_text(SHOW_TEMPLATE)
+
+    return app_labels
+
+
+def setup_django(root, app_labels):
+    """Configure Django to use the synthetic project and a SQLite database"""
+    import django
+    from django.conf import settings
+
+    sys.path.insert(0, str(root))
+    os.chdir(root)
+    settings.configure(
+        SECRET_KEY="django-migration-docs-benchmark",
+        INSTALLED_APPS=["migration_docs", *app_labels],
+        DATABASES={
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": str(root / "db.sqlite3"),
+            }
+        },
+        DEFAULT_AUTO_FIELD="django.db.models.AutoField",
+        USE_TZ=False,
+    )
+    django.setup()
+
+
+def timed(func, *, repeat, setup=None):
+    """The best wall time of running a function
+
+    Objects that exist before every run are frozen so that garbage
+    collection only scans the objects of the run. Otherwise, collections
+    take longer with every object that earlier benchmarks left behind,
+    which makes benchmarks of larger projects look superlinear.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        gc.collect()
+        gc.freeze()
+        try:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.unfreeze()
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def access_attribute(migrations, attr):
+    """Access an attribute of every migration ``ATTRIBUTE_ACCESSES`` times"""
+    for _ in range(ATTRIBUTE_ACCESSES):
+        for migration in migrations:
+            getattr(migration, attr)
+
+
+def run_benchmarks(root, *, repeat):
+    """Time the core operations of django-migration-docs
+
+    Returns:
+        dict: The best wall time of every benchmark, keyed on name.
+    """
+    from migration_docs import core
+
+    docs_file = root / ".migration-docs" / "docs.yaml"
+    original_docs = docs_file.read_text()
+    cache_root = root / ".migration-docs" / "cache"
+
+    def restore_docs():
+        docs_file.write_text(original_docs)
+
+    def clear_cache():
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    def restore_docs_and_clear_sql_cache():
+        restore_docs()
+        shutil.rmtree(cache_root / "sql", ignore_errors=True)
+
+    def load_docs():
+        return core.MigrationDocs().data
+
+    docs = load_docs()
+
+    results = {
+        "Migrations()": timed(core.Migrations, repeat=repeat),
+        "check": timed(lambda: core.check(msg=core._no_msg), repeat=repeat),
+        "check --fast": timed(lambda: core.check(msg=core._no_msg, fast=True), repeat=repeat),
+        "sync": timed(
+            lambda: core.sync(msg=core._no_msg),
+            repeat=repeat,
+            setup=restore_docs_and_clear_sql_cache,
+        ),
+        "sync (warm SQL cache)": timed(
+            lambda: core.sync(msg=core._no_msg), repeat=repeat, setup=restore_docs
+        ),
+        "show (grouped)": timed(lambda: core.show(style="grouped"), repeat=repeat),
+        "MigrationDocs load (cold)": timed(load_docs, repeat=repeat, setup=clear_cache),
+        "MigrationDocs load (warm)": timed(load_docs, repeat=repeat),
+        "MigrationDocs save": timed(
+            lambda: core._write_docs_file("docs.yaml", docs), repeat=repeat
+        ),
+    }
+
+    # Load migrations after timing Migrations() so that their modules are
+    # imported while it is timed. Load their docs and the schema before
+    # timing lookups
+    migrations = core.Migrations()
+    access_attribute(migrations, "type")
+    results.update(
+        {
+            "Migration.label": timed(lambda: access_attribute(migrations, "label"), repeat=repeat),
+            "Migration docs attribute": timed(
+                lambda: access_attribute(migrations, "point_of_contact"), repeat=repeat
+            ),
+            "Migration schema default": timed(
+                lambda: access_attribute(migrations, "type"), repeat=repeat
+            ),
+        }
+    )
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--apps", type=int, default=50, help="The number of apps.")
+    parser.add_argument(
+        "--migrations", type=int, default=20, help="The number of migrations per app."
+    )
+    parser.add_argument(
+        "--operations", type=int, default=3, help="The number of operations per migration."
+    )
+    parser.add_argument(
+        "--dependencies",
+        type=int,
+        default=2,
+        help="The number of earlier apps that every app depends on.",
+    )
+    parser.add_argument(
+        "--docs-size",
+        type=int,
+        default=500,
+        help="The number of characters in the description of every migration.",
+    )
+    parser.add_argument(
+        "--stale",
+        type=float,
+        default=0.05,
+        help="The fraction of migration docs that are stale and updated by sync.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Report the best time of this many runs."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help=(
+            "Exit with an error if a benchmark exceeds its regression threshold or"
+            " grows more than linearly on a project with twice the apps."
+        ),
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    # Import the package from this checkout rather than an installed copy
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = pathlib.Path(tmp_dir)
+        app_labels = generate_project(
+            root,
+            apps=args.apps,
+            migrations=args.migrations,
+            operations=args.operations,
+            dependencies=args.dependencies,
+            docs_size=args.docs_size,
+            stale=args.stale,
+        )
+        setup_django(root, app_labels)
+        results = run_benchmarks(root, repeat=args.repeat)
+
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results))
+
+    total_migrations = args.apps * args.migrations
+    print(f"{args.apps} apps x {args.migrations} migrations ({total_migrations} total)")
+
+    regressions = []
+    for name, elapsed in results.items():
+        threshold = THRESHOLDS[name] * max(total_migrations, 1000) / 1000
+        status = "ok"
+        if elapsed > threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+
+        print(f"{name:<28}{elapsed:>9.3f}s  (threshold {threshold:.2f}s, {status})")
+
+    if args.check:
+        regressions += check_growth(args, results)
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+def check_growth(args, results):
+    """
+    Run the benchmarks in another process on a project with twice the apps
+    and the same number of stale docs, since Django can only be set up once
+    per process. Print how much every benchmark grows.
+
+    Returns:
+        List[str]: The names of benchmarks that grow more than ``MAX_GROWTH``.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = pathlib.Path(tmp_dir) / "results.json"
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                f"--apps={args.apps * 2}",
+                f"--migrations={args.migrations}",
+                f"--operations={args.operations}",
+                f"--dependencies={args.dependencies}",
+                f"--docs-size={args.docs_size}",
+                f"--stale={args.stale / 2}",
+                f"--repeat={args.repeat}",
+                f"--output={output}",
+            ],
+            check=True,
+        )
+        doubled_results = json.loads(output.read_text())
+
+    regressions = []
+    for name, elapsed in results.items():
+        if name in CONSTANT_TIME_BENCHMARKS:
+            status = "not compared"
+        elif max(elapsed, doubled_results[name]) < MIN_GROWTH_TIME:
+            status = "too fast to compare"
+        else:
+            growth = doubled_results[name] / max(elapsed, MIN_GROWTH_TIME)
+            status = f"{growth:.1f}x, ok"
+            if growth > MAX_GROWTH:
+                status = f"{growth:.1f}x, REGRESSION"
+                regressions.append(f"{name} (growth)")
+
+        print(f"{name:<28}growth with twice the apps ({status})")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
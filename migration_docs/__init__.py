@@ -1,19 +1,54 @@
 import django
 
-from migration_docs.core import Migration, Migrations, bootstrap, check, show, sync, update
-from migration_docs.version import __version__
+# Avoid importing typing, which the client does not need
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from migration_docs.core import (
+        Migration,
+        Migrations,
+        bootstrap,
+        check,
+        convert,
+        gc,
+        show,
+        snapshot,
+        sync,
+        update,
+        watch,
+    )
+    from migration_docs.version import __version__
 
 __all__ = [
     "bootstrap",
     "check",
+    "convert",
+    "gc",
     "show",
+    "snapshot",
     "sync",
     "update",
+    "watch",
     "Migration",
     "Migrations",
     "__version__",
 ]
 
+
+def __getattr__(name):
+    # Import the core module lazily so that the client can talk to the
+    # daemon without importing Django's ORM
+    if name == "__version__":
+        from migration_docs import version
+
+        return version.__version__
+    elif name in __all__:
+        from migration_docs import core
+
+        return getattr(core, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if django.VERSION < (3, 2):  # pragma: no cover
     default_app_config = "migration_docs.apps.MigrationDocsConfig"
 
@@ -1,19 +1,33 @@
+import os
+
 from django.apps import AppConfig
 from django.conf import settings
-from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
 from django.db.models.signals import pre_migrate
 
+import migration_docs
+from migration_docs import profiling
+
 _current_migration_run = None
 
 
-def sync_docs_on_pre_migrate(plan, interactive, **kwargs):
+def sync_docs_on_pre_migrate(plan, interactive, using=DEFAULT_DB_ALIAS, **kwargs):
     """
     Sync docs on pre_migrate.
 
     pre_migrate is called for every django app. We only want to sync
     docs before all migrations begin. We achieve this by keeping
     track of the ID of the migration plan and only running sync
-    when the plan changes
+    when the plan changes.
+
+    Only the docs of migrations that are about to be applied, along with
+    migrations that are missing docs, are synced.
+
+    The signal doesn't carry the loader of ``migrate``, and the SQL of new
+    docs is rendered against the state of the whole migration graph, so
+    sync loads the graph again. ``migrate`` already imported the migration
+    modules, so they are not imported again. Loading the graph costs one
+    query of applied migrations.
     """
     global _current_migration_run
 
@@ -22,7 +36,10 @@ def sync_docs_on_pre_migrate(plan, interactive, **kwargs):
         and getattr(settings, "MIGRATION_DOCS_PRE_MIGRATE_SYNC", False)
         and interactive
     ):
-        call_command("migration_docs", "sync")
+        migration_docs.sync(
+            using=using,
+            labels=[str(migration) for migration, backwards in plan or [] if not backwards],
+        )
 
     _current_migration_run = id(plan)
 
@@ -33,6 +50,14 @@ class MigrationDocsConfig(AppConfig):
 
     def ready(self):
         """
-        Listen for pre-migrate signals and prompt for migration docs.
+        Listen for pre-migrate signals and prompt for migration docs. Start
+        tracing when a trace file is configured.
         """
         pre_migrate.connect(sync_docs_on_pre_migrate, dispatch_uid="sync_docs_on_pre_migrate")
+
+        # Trace migration_docs for the lifetime of the process when configured
+        trace_file = os.environ.get("MIGRATION_DOCS_TRACE_FILE") or getattr(
+            settings, "MIGRATION_DOCS_TRACE_FILE", None
+        )
+        if trace_file:
+            profiling.start_tracing(trace_file)
@@ -0,0 +1,127 @@
+"""A thin client for the migration_docs daemon
+
+Runs ``check`` and ``show`` on a daemon started with
+``manage.py migration_docs serve`` without setting up Django. Only the
+standard library is imported so that the client starts quickly::
+
+    python -m migration_docs.client check --fast
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+# The default socket path, relative to the project directory. The daemon
+# uses the same path unless MIGRATION_DOCS_CACHE_DIR is configured
+DEFAULT_SOCKET = os.path.join(".migration-docs", "cache", "daemon.sock")
+
+# The subcommands that the daemon runs
+COMMANDS = ("check", "show")
+
+# The default number of seconds to wait for the daemon to respond
+DEFAULT_TIMEOUT = 60
+
+
+def get_socket_path(path=None):
+    """The socket path, which can be set with the MIGRATION_DOCS_SOCKET env var"""
+    return path or os.environ.get("MIGRATION_DOCS_SOCKET") or DEFAULT_SOCKET
+
+
+def send(f, message):
+    """Send a message as a line of JSON"""
+    f.write(json.dumps(message).encode() + b"\n")
+    f.flush()
+
+
+def receive(f):
+    """Receive a line of JSON. Returns None when the connection is closed"""
+    line = f.readline()
+    return json.loads(line) if line else None
+
+
+def request(path, argv, stdout=None, stderr=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Run a migration_docs subcommand on the daemon listening on a socket.
+
+    Args:
+        path (str): The path of the socket.
+        argv (List[str]): The subcommand and its arguments.
+        stdout (file, default=sys.stdout): Where output is written.
+        stderr (file, default=sys.stderr): Where errors are written.
+        timeout (float, default=60): The number of seconds to wait for the
+            daemon to accept the connection and to respond. Waits
+            indefinitely if None.
+
+    Returns:
+        int: The exit code of the subcommand.
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except BlockingIOError:
+        # The daemon is listening but its backlog of connections is full
+        conn.close()
+        stderr.write(f"django-migration-docs: The daemon listening on {path} is busy.\n")
+        return 2
+    except OSError:
+        conn.close()
+        stderr.write(
+            f"django-migration-docs: No daemon is listening on {path}."
+            ' Start one with "manage.py migration_docs serve".\n'
+        )
+        return 2
+
+    try:
+        with conn, conn.makefile("rwb") as f:
+            send(f, {"argv": list(argv), "cwd": os.getcwd()})
+            response = receive(f)
+    except socket.timeout:
+        stderr.write(f"django-migration-docs: The daemon didn't respond within {timeout:g}s.\n")
+        return 2
+    except OSError:
+        response = None
+
+    if response is None:
+        stderr.write("django-migration-docs: The daemon closed the connection.\n")
+        return 2
+
+    stdout.write(response["stdout"])
+    stderr.write(response["stderr"])
+    return response["exit_code"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="migration-docs-client",
+        description='Runs "check" or "show" on a running "manage.py migration_docs serve" daemon.',
+    )
+    parser.add_argument(
+        "--socket",
+        help=(
+            "The socket of the daemon. Defaults to the MIGRATION_DOCS_SOCKET environment"
+            f" variable or {DEFAULT_SOCKET}."
+        ),
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=(
+            "The number of seconds to wait for the daemon to respond. Defaults to"
+            f" {DEFAULT_TIMEOUT}."
+        ),
+    )
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    return request(get_socket_path(args.socket), [args.command, *args.args], timeout=args.timeout)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -1,22 +1,65 @@
+import ast
 import collections
+import concurrent.futures
+import contextlib
+import functools
+import gzip
 import hashlib
+import importlib.util
 import inspect
+import io
+import json
+import marshal
 import os
 import pathlib
-from typing import Callable, List, Union
+import pkgutil
+import shutil
+import subprocess
+import threading
+import time
+import tokenize
+from typing import Callable, Dict, Iterable, Iterator, List, Union
 
 import click
 import django
 import formaldict
 import jinja2
 import yaml
+from django.apps import apps
 from django.conf import settings
 from django.db import connections
 from django.db.migrations import executor as django_migration_executor
 from django.db.migrations import loader as django_migration_loader
+from django.db.migrations import recorder as django_migration_recorder
+from django.db.migrations.state import ProjectState
 from django.utils.functional import cached_property
 
-from migration_docs import utils
+from migration_docs import profiling, utils
+from migration_docs.version import __version__
+
+# Parse YAML with libyaml when it is available. Note that docs are always
+# dumped with the pure-Python emitter since libyaml folds long quoted
+# strings differently, which would change the contents of existing docs files
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class _DocsDumper(yaml.Dumper):
+    """Dumps ordered docs without registering representers on ``yaml.Dumper``"""
+
+
+_DocsDumper.add_representer(
+    collections.OrderedDict,
+    lambda dumper, data: dumper.represent_mapping("tag:yaml.org,2002:map", data.items()),
+)
+
+# Bump when the format of snapshot files changes
+SNAPSHOT_VERSION = 1
+
+# The kinds of migration fingerprints. See `_hash_source`
+FINGERPRINT_KINDS = ("source", "ast")
+
+# Where the SQL of migration docs is stored. See `_store_sql`
+SQL_STORES = ("inline", "blobs")
 
 # The default Jinja template for showing migrations
 DEFAULT_MIGRATION_TEMPLATE = """
@@ -40,6 +83,551 @@ def _get_migration_docs_file_path(file_name):
     return os.path.join(_get_migration_docs_file_root(), file_name)
 
 
+def _get_migration_docs_cache_root():
+    """
+    Get the root path to migration docs cache files. Configurable with the
+    ``MIGRATION_DOCS_CACHE_DIR`` setting.
+    """
+    return getattr(settings, "MIGRATION_DOCS_CACHE_DIR", None) or os.path.join(
+        _get_migration_docs_file_root(), "cache"
+    )
+
+
+def _get_migration_docs_cache_path(file_name):
+    """
+    Get the path to a migration docs cache file.
+    """
+    return os.path.join(_get_migration_docs_cache_root(), file_name)
+
+
+def _make_migration_docs_cache_root():
+    """
+    Create the root directory of migration docs cache files, keeping it out
+    of version control.
+    """
+    cache_root = pathlib.Path(_get_migration_docs_cache_root())
+    cache_root.mkdir(parents=True, exist_ok=True)
+
+    gitignore = cache_root / ".gitignore"
+    if not gitignore.exists():
+        gitignore.write_text("*\n")
+
+    return cache_root
+
+
+def _get_docs_index_key(raw, stat):
+    """
+    The key that validates the compiled index of a docs file. The index is
+    only used when the key of the docs file matches the key of the index.
+    """
+    return (__version__, stat.st_size, stat.st_mtime_ns, hashlib.md5(raw).hexdigest())
+
+
+def _read_docs_index(file_name, key):
+    """Read the parsed docs of a docs file from its compiled index"""
+    try:
+        with open(_get_migration_docs_cache_path(f"{file_name}.marshal"), "rb") as f:
+            index = marshal.load(f)
+    except Exception:
+        # Missing, corrupt, or incompatible indices are rebuilt
+        return None
+
+    if not isinstance(index, dict) or index.get("key") != key:
+        return None
+
+    return index.get("data")
+
+
+def _to_index_data(value):
+    """
+    Convert docs to the builtin types that `marshal` supports, such as the
+    ordered dicts of saved docs
+    """
+    if isinstance(value, dict):
+        return {key: _to_index_data(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [_to_index_data(item) for item in value]
+
+    return value
+
+
+def _write_docs_index(file_name, key, data):
+    """
+    Write the compiled index of a docs file so that it doesn't need to be
+    parsed again until it changes. The index is skipped when the cache
+    directory can't be written, such as in read-only checkouts, or when
+    the docs have values that `marshal` doesn't support, such as dates.
+
+    Indices are written with `marshal` instead of `pickle` since the cache
+    directory may be shared between CI jobs, and loading a pickle can run
+    arbitrary code.
+    """
+    try:
+        index = marshal.dumps({"key": key, "data": _to_index_data(data)})
+    except ValueError:
+        return
+
+    try:
+        index_file = _make_migration_docs_cache_root() / f"{file_name}.marshal"
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically so that concurrent processes never read partial indices
+        tmp_index_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+        with open(tmp_index_file, "wb") as f:
+            f.write(index)
+        os.replace(tmp_index_file, index_file)
+    except OSError:
+        pass
+
+
+def _get_fingerprint_kind():
+    """
+    Get the kind of fingerprint used to hash migrations. Configurable with the
+    ``MIGRATION_DOCS_FINGERPRINT`` setting.
+    """
+    kind = getattr(settings, "MIGRATION_DOCS_FINGERPRINT", "source")
+    if kind not in FINGERPRINT_KINDS:
+        raise RuntimeError(
+            f'django-migration-docs: Invalid MIGRATION_DOCS_FINGERPRINT "{kind}".'
+            f" Must be one of {', '.join(FINGERPRINT_KINDS)}."
+        )
+
+    return kind
+
+
+def _get_hash_kind(digest):
+    """The kind of fingerprint of a hash stored in migration docs"""
+    kind, sep, _ = digest.partition(":")
+    return kind if sep else "source"
+
+
+# Fields of syntax tree nodes that were added in later Python versions and
+# are always empty in migrations
+_IGNORED_AST_FIELDS = frozenset({"type_params"})
+
+
+def _dump_ast(node):
+    """
+    Dump a syntax tree as its node types and fields. Unlike `ast.dump`, the
+    output is the same on every supported Python version since fields that
+    are empty or only exist in later versions are left out.
+    """
+    if isinstance(node, ast.AST):
+        fields = ", ".join(
+            f"{name}={_dump_ast(value)}"
+            for name, value in ast.iter_fields(node)
+            if name not in _IGNORED_AST_FIELDS and value is not None and value != []
+        )
+        return f"{type(node).__name__}({fields})"
+    elif isinstance(node, list):
+        return f"[{', '.join(_dump_ast(item) for item in node)}]"
+
+    return repr(node)
+
+
+def _normalize_source(source):
+    """
+    Dump the syntax tree of migration source code without the formatting,
+    comments, docstrings, and import order that don't change what the
+    migration does.
+    """
+    tree = ast.parse(source)
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+            and node.body
+            and isinstance(node.body[0], ast.Expr)
+            and isinstance(node.body[0].value, ast.Constant)
+            and isinstance(node.body[0].value.value, str)
+        ):
+            node.body = node.body[1:]
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            node.names.sort(key=lambda alias: (alias.name, alias.asname or ""))
+
+    # Sort the leading block of imports like isort does
+    num_imports = 0
+    while num_imports < len(tree.body) and isinstance(
+        tree.body[num_imports], (ast.Import, ast.ImportFrom)
+    ):
+        num_imports += 1
+
+    tree.body[:num_imports] = sorted(tree.body[:num_imports], key=_dump_ast)
+    return _dump_ast(tree)
+
+
+def _hash_source(source, kind="source"):
+    """The fingerprint of migration source code
+
+    The "source" fingerprint is the MD5 hash of the source. The "ast"
+    fingerprint is the MD5 hash of the normalized syntax tree of the source
+    (see `_normalize_source`), prefixed with "ast:" so that the kind of
+    fingerprint is stored along with it in the docs. Source that cannot be
+    parsed falls back to the "source" fingerprint.
+    """
+    if kind == "ast":
+        try:
+            normalized = _normalize_source(source)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            return f"ast:{hashlib.md5(normalized.encode()).hexdigest()}"
+
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+def _get_sql_store():
+    """
+    Get where the SQL of migration docs is stored. Configurable with the
+    ``MIGRATION_DOCS_SQL_STORE`` setting.
+    """
+    store = getattr(settings, "MIGRATION_DOCS_SQL_STORE", "inline")
+    if store not in SQL_STORES:
+        raise RuntimeError(
+            f'django-migration-docs: Invalid MIGRATION_DOCS_SQL_STORE "{store}".'
+            f" Must be one of {', '.join(SQL_STORES)}."
+        )
+
+    return store
+
+
+def _get_sql_blob_paths(digest):
+    """The possible paths of an uncompressed and a compressed SQL blob"""
+    path = _get_migration_docs_file_path(os.path.join("sql", digest))
+    return f"{path}.sql", f"{path}.sql.gz"
+
+
+def _write_sql_blob(sql):
+    """
+    Write SQL to a blob in ``.migration-docs/sql`` named after the SHA-256
+    digest of the SQL, compressing it when the ``MIGRATION_DOCS_SQL_COMPRESS``
+    setting is True. Return the digest.
+    """
+    data = sql.encode()
+    digest = hashlib.sha256(data).hexdigest()
+    path, compressed_path = _get_sql_blob_paths(digest)
+    if os.path.exists(path) or os.path.exists(compressed_path):
+        return digest
+
+    if getattr(settings, "MIGRATION_DOCS_SQL_COMPRESS", False):
+        # Leave the modification time out of the header so that blobs of the
+        # same SQL are identical
+        path, data = compressed_path, gzip.compress(data, mtime=0)
+
+    # Write atomically so that concurrent processes never read partial blobs
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    return digest
+
+
+def _read_sql_blob(digest):
+    """Read the SQL of a blob. Return None if the blob does not exist"""
+    path, compressed_path = _get_sql_blob_paths(digest)
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode()
+    except FileNotFoundError:
+        pass
+
+    try:
+        with gzip.open(compressed_path, "rb") as f:
+            return f.read().decode()
+    except FileNotFoundError:
+        return None
+
+
+def _store_sql(docs, sql):
+    """Return a copy of migration docs with SQL stored in the configured SQL store
+
+    Inline SQL is stored in the ``sql`` key of the docs. Otherwise SQL is
+    stored in a content-addressed blob and the docs only keep its digest in
+    the ``_sql`` key.
+    """
+    docs = {key: value for key, value in docs.items() if key not in ("sql", "_sql")}
+    if _get_sql_store() == "blobs":
+        docs["_sql"] = _write_sql_blob(sql)
+    else:
+        docs["sql"] = sql
+
+    return docs
+
+
+def _get_docs_sql_store(docs):
+    """The SQL store used by migration docs, if they have SQL"""
+    if "_sql" in docs:
+        return "blobs"
+    elif "sql" in docs:
+        return "inline"
+
+
+def _load_sql(docs):
+    """Load the SQL of migration docs from their SQL store. Return None if missing"""
+    if "_sql" in docs:
+        return _read_sql_blob(docs["_sql"])
+    else:
+        return docs.get("sql")
+
+
+def _prune_sql_blobs(data):
+    """
+    Remove SQL blobs that are not referenced by any migration docs. Return
+    the number of removed blobs.
+    """
+    sql_root = _get_migration_docs_file_path("sql")
+    if not os.path.isdir(sql_root):
+        return 0
+
+    referenced = {docs["_sql"] for docs in data.values() if docs and "_sql" in docs}
+    num_removed = 0
+    for file_name in os.listdir(sql_root):
+        digest, _, ext = file_name.partition(".")
+        if ext in ("sql", "sql.gz") and digest not in referenced:
+            os.remove(os.path.join(sql_root, file_name))
+            num_removed += 1
+
+    return num_removed
+
+
+def _decode_source(data):
+    """
+    Decode the source of a python file the same way ``inspect.getsource``
+    does so that hashes of files and of loaded modules are identical.
+    """
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    source = data.decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+
+    if source and not source.endswith("\n"):
+        source += "\n"
+
+    return source
+
+
+def _read_source(path):
+    """Read the source of a python file. See `_decode_source`"""
+    with open(path, "rb") as f:
+        return _decode_source(f.read())
+
+
+def _parse_replaces(data):
+    """
+    Parse the labels of the migrations replaced by a squashed migration
+    without executing the migration file.
+    """
+    for node in ast.walk(ast.parse(data)):
+        if isinstance(node, ast.ClassDef) and node.name == "Migration":
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and any(
+                    isinstance(target, ast.Name) and target.id == "replaces"
+                    for target in statement.targets
+                ):
+                    return [
+                        f"{app_label}.{name}"
+                        for app_label, name in ast.literal_eval(statement.value)
+                    ]
+
+    return []
+
+
+def _get_app_label(label):
+    """Get the app label of a migration label"""
+    return label.split(".", 1)[0]
+
+
+@profiling.phased("save docs")
+def _write_docs_file(file_name, data, text=None):
+    """
+    Write docs to a file ordered by label to keep YAML consistently ordered.
+    The file and its compiled index are left untouched if its contents,
+    ``text``, would not change. Return the new contents of the file.
+    """
+    ordered_docs = collections.OrderedDict((label, docs) for label, docs in sorted(data.items()))
+    yaml_str = yaml.dump(ordered_docs, Dumper=_DocsDumper)
+    if yaml_str != text:
+        docs_file = _get_migration_docs_file_path(file_name)
+        pathlib.Path(docs_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(docs_file, "w+") as f:
+            f.write(yaml_str)
+
+        raw = yaml_str.encode()
+        _write_docs_index(file_name, _get_docs_index_key(raw, os.stat(docs_file)), data)
+
+    return yaml_str
+
+
+def _get_forwards_plan(graph):
+    """Return the keys of every node in a migration graph in plan order
+
+    The order is the same as concatenating ``graph.forwards_plan`` for every
+    leaf node and removing duplicates. Instead of walking the full ancestry
+    of every leaf, the depth-first search shares its visited nodes across
+    leaves so that every node is only visited once.
+    """
+    plan = []
+    visited = set()
+    for target in graph.leaf_nodes():
+        stack = [(graph.node_map[target], False)]
+        while stack:
+            node, processed = stack.pop()
+            if node in visited:
+                continue
+            elif processed:
+                visited.add(node)
+                plan.append(node.key)
+            else:
+                stack.append((node, True))
+                stack += [(parent, False) for parent in sorted(node.parents)]
+
+    return plan
+
+
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """A bytecode cache that skips templates it can't write"""
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+@functools.lru_cache(maxsize=None)
+def _get_show_environment(file_root, cache_root):
+    """
+    Get the Jinja environment for rendering show templates.
+
+    The environment is created once per process so that compiled templates
+    are reused until their files change. Compiled templates are also stored
+    in a bytecode cache so that they are reused across processes, unless
+    the cache directory can't be written.
+    """
+    bytecode_cache_root = os.path.join(cache_root, "templates")
+    try:
+        _make_migration_docs_cache_root()
+        os.makedirs(bytecode_cache_root, exist_ok=True)
+        bytecode_cache = _BytecodeCache(bytecode_cache_root)
+    except OSError:
+        bytecode_cache = None
+
+    def load_default_template(name):
+        # Use the default migration template if the user didn't provide one.
+        # It stops being used as soon as the user adds one
+        if name == "show.tpl":
+            path = os.path.join(file_root, name)
+            return DEFAULT_MIGRATION_TEMPLATE, None, lambda: not os.path.exists(path)
+
+    return jinja2.Environment(
+        loader=jinja2.ChoiceLoader(
+            [
+                jinja2.FileSystemLoader(file_root),
+                jinja2.FunctionLoader(load_default_template),
+            ]
+        ),
+        bytecode_cache=bytecode_cache,
+        trim_blocks=True,
+    )
+
+
+def _read_snapshot(path):
+    """
+    Read the applied migrations of a snapshot file in the format of
+    ``MigrationLoader.applied_migrations``.
+    """
+    try:
+        with open(path, "r") as f:
+            snapshot = json.load(f)
+
+        if snapshot["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported version "{snapshot["version"]}"')
+
+        return {
+            (app_label, name): None
+            for app_label, names in snapshot["applied"].items()
+            for name in names
+        }
+    except Exception as exc:
+        raise RuntimeError(
+            f'django-migration-docs: Could not read applied migrations from "{path}".'
+            ' Create a snapshot with "manage.py migration_docs snapshot".'
+        ) from exc
+
+
+def _get_applied_migrations(aliases, timeout=None):
+    """
+    Query the applied migrations of databases concurrently, keyed by alias.
+
+    Every database is queried in its own daemon thread with its own
+    connection so that a database that doesn't respond within the timeout
+    never blocks the process from exiting.
+    """
+    results = {}
+
+    def query(alias):
+        try:
+            connection = connections[alias]
+            try:
+                with profiling.span("query database", alias=alias):
+                    recorder = django_migration_recorder.MigrationRecorder(connection)
+                    results[alias] = recorder.applied_migrations()
+            finally:
+                connection.close()
+        except Exception as exc:
+            results[alias] = exc
+
+    threads = [threading.Thread(target=query, args=(alias,), daemon=True) for alias in aliases]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0) if deadline is not None else None)
+
+    for alias in aliases:
+        if alias not in results:
+            raise RuntimeError(
+                f"django-migration-docs: Timed out after {timeout} seconds reading applied"
+                f' migrations of the "{alias}" database.'
+            )
+        elif isinstance(results[alias], Exception):
+            raise RuntimeError(
+                f'django-migration-docs: Could not read applied migrations of the "{alias}"'
+                " database."
+            ) from results[alias]
+
+    return {alias: results[alias] for alias in aliases}
+
+
+class _PreloadedMigrationLoader(django_migration_loader.MigrationLoader):
+    """
+    A migration loader that takes applied migrations that were already read,
+    such as from a snapshot, instead of querying the database.
+    """
+
+    def __init__(self, connection, applied_migrations):
+        self._applied_migrations = applied_migrations
+        super().__init__(None, ignore_no_migrations=True)
+
+        # The connection is only used for rendering SQL
+        self.connection = connection
+
+    @property
+    def applied_migrations(self):
+        return self._applied_migrations
+
+    @applied_migrations.setter
+    def applied_migrations(self, applied_migrations):
+        # Django resets the applied migrations when building the graph
+        # without a connection. Keep the preloaded ones instead
+        pass
+
+
+def _sql_error_msg(exc):
+    """The SQL stored for a migration when its SQL cannot be collected"""
+    return f'Error obtaining SQL - "{exc}"'
+
+
 def _no_msg(msg, fg="green"):
     """A message printer that does nothing"""
     pass
@@ -62,21 +650,67 @@ class Migration:
     a ``type`` attribute on this object.
     """
 
-    def __init__(self, node, *, executor, loader, docs):
+    __slots__ = (
+        "_node",
+        "_executor",
+        "_loader",
+        "_docs",
+        "_plan",
+        "_label",
+        "_cached_hash",
+        "_cached_sql",
+    )
+
+    def __init__(self, node, *, executor, loader, docs, plan=None):
         self._node = node
         self._executor = executor
         self._loader = loader
         self._docs = docs
+        self._plan = plan
+        self._label = str(node)
+        self._cached_hash = None
+        self._cached_sql = None
 
     @property
     def applied(self):
         """True if the migration has been applied"""
         return (self.app_label, self.name) in self._loader.applied_migrations
 
-    @cached_property
+    @property
+    def applied_on(self):
+        """A dictionary of database aliases and whether the migration is applied to them"""
+        databases = self._plan._applied if self._plan is not None else {}
+        key = (self.app_label, self.name)
+        return {
+            alias: key in applied_migrations for alias, applied_migrations in databases.items()
+        }
+
+    @property
     def hash(self):
-        """The MD5 hash of the migration file"""
-        return hashlib.md5(inspect.getsource(inspect.getmodule(self._node)).encode()).hexdigest()
+        """The fingerprint of the migration file. See `_hash_source`"""
+        if self._cached_hash is None:
+            self._cached_hash = self._hash_as(_get_fingerprint_kind())
+
+        return self._cached_hash
+
+    def _hash_as(self, kind):
+        """Hash the migration file with a kind of fingerprint"""
+        if self._cached_hash is not None and _get_hash_kind(self._cached_hash) == kind:
+            return self._cached_hash
+
+        with profiling.phase("hash migrations"):
+            path = self._get_cacheable_path()
+            if path:
+                return self._plan._hash_cache.digest(path, kind=kind)
+            else:
+                module = inspect.getmodule(self._node)
+                return _hash_source(inspect.getsource(module), kind=kind)
+
+    def _get_cacheable_path(self):
+        """The path of the migration file if its hash can be cached"""
+        path = getattr(inspect.getmodule(self._node), "__file__", None)
+        if self._plan is not None and path and path.endswith(".py") and os.path.isfile(path):
+            return path
 
     @property
     def atomic(self):
@@ -103,9 +737,44 @@ class Migration:
         """String representations of the migration operations"""
         return [str(operation) for operation in self.operations]
 
-    @cached_property
+    @property
     def sql(self):
-        """The raw SQL for the migration"""
+        """The raw SQL for the migration
+
+        SQL is loaded from the SQL store when the docs of the migration are
+        up to date and keep their SQL in a blob. Otherwise, when the
+        migration belongs to a `Migrations` plan, SQL is only rendered for
+        this migration. The project state is carried forward from where the
+        plan last collected SQL, so accessing the SQL of migrations in plan
+        order replays the state of the plan once.
+        """
+        if self._cached_sql is None:
+            self._cached_sql = self._load_stored_sql()
+
+        if self._cached_sql is None:
+            if self._plan is not None:
+                self._plan.collect_sql([self])
+            else:
+                self._cached_sql = self._collect_sql()
+
+        return self._cached_sql
+
+    def _load_stored_sql(self):
+        """Load the SQL of up-to-date docs from a blob. Return None if unavailable"""
+        docs = self._docs.get(self._label)
+        if (
+            not docs
+            or "_sql" not in docs
+            or "_hash" not in docs
+            or docs["_hash"] != self._hash_as(_get_hash_kind(docs["_hash"]))
+        ):
+            return None
+
+        return _read_sql_blob(docs["_sql"])
+
+    @profiling.phased("collect sql")
+    def _collect_sql(self):
+        """Collect the SQL of this migration in isolation"""
         if (django.VERSION[0] >= 3 and django.VERSION[1] >= 1) or django.VERSION[0] >= 4:
             migration_sql_obj = self._loader
         else:  # pragma: no cover
@@ -115,33 +784,36 @@ class Migration:
             sql_statements = migration_sql_obj.collect_sql([(self._node, False)])
             return "\n".join(sql_statements)
         except Exception as exc:
-            return f'Error obtaining SQL - "{exc}"'
+            return _sql_error_msg(exc)
 
     @property
     def label(self):
         """The unique identifying label of the migration"""
-        return str(self._node)
+        return self._label
 
     def __str__(self):
         return self.label
 
-    def __getattribute__(self, attr):
+    def __getattr__(self, attr):
         """
         Allows migration docs to be accessed as attributes on the Migration
         or the migration docs.
 
         Doing this provides the ability for users to filter Migrations
-        by any documented attribute.
+        by any documented attribute. Only called when normal attribute
+        lookup fails.
         """
-        try:
-            return object.__getattribute__(self, attr)
-        except AttributeError:
-            if self._docs.get(self.label) and attr in self._docs[self.label]:
-                return self._docs[self.label][attr]
-            elif attr in self._docs.schema:
-                return None
-            else:
-                raise
+        if attr in Migration.__slots__:
+            # An internal attribute was accessed before it was set
+            raise AttributeError(attr)
+
+        docs = self._docs.get(self._label)
+        if docs and attr in docs:
+            return docs[attr]
+        elif attr in self._docs.schema:
+            return None
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'")
 
     def set_docs(self, prompt=True, defaults=None):
         """Set docs about a migration
@@ -152,15 +824,17 @@ class Migration:
             defaults (dict, default=None): When prompting, use these values
                 as defaults.
         """
-        if self.label not in self._docs:
-            self._docs[self.label] = {}
-        self._docs[self.label]["_hash"] = self.hash
-        self._docs[self.label]["atomic"] = self.atomic
-        self._docs[self.label]["sql"] = self.sql
+        # Only store the docs once they are complete so that an interrupted
+        # prompt never leaves docs that look up to date
+        docs = _store_sql(self._docs.get(self.label) or {}, self.sql)
+        docs["_hash"] = self.hash
+        docs["atomic"] = self.atomic
 
         if prompt:
-            self._docs[self.label].update(self._docs.schema.prompt(defaults=defaults))
+            with profiling.phase("prompt"):
+                docs.update(self._docs.schema.prompt(defaults=defaults))
 
+        self._docs[self.label] = docs
         self._docs.save()
 
 
@@ -175,37 +849,114 @@ class Migrations(utils.FilterableUserList):
         using: str = "default",
         loader: Union[django_migration_loader.MigrationLoader, None] = None,
         executor: Union[django_migration_executor.MigrationExecutor, None] = None,
+        verify_hashes: bool = False,
+        jobs: Union[int, None] = None,
+        applied_from: Union[str, None] = None,
+        databases: Union[List[str], str, None] = None,
+        timeout: Union[float, None] = None,
     ):
+        """
+        Args:
+            using: The database alias used to determine applied migrations.
+            loader: A migration loader to use instead of loading migrations.
+            executor: A migration executor to use instead of creating one.
+            verify_hashes: Re-hash every migration file instead of trusting
+                hashes in the cache for files that have not changed.
+            jobs: The number of threads used to hash migration files.
+                Defaults to the default of `concurrent.futures.ThreadPoolExecutor`.
+            applied_from: The path of a snapshot file created with `snapshot`.
+                Applied migrations are read from the snapshot instead of
+                querying the database.
+            databases: Database aliases, or "all" for every database, to
+                query applied migrations of concurrently. Results are
+                available in ``Migration.applied_on``. The ``using`` database
+                is always queried.
+            timeout: The number of seconds to wait for the applied migrations
+                of ``databases``. Waits indefinitely by default.
+        """
         connection = connections[using]
-        self._loader = loader or django_migration_loader.MigrationLoader(
-            connection, ignore_no_migrations=True
-        )
+        if databases == "all":
+            databases = list(connections)
+
+        self._applied = {}
+        if loader:
+            self._loader = loader
+        else:
+            # Query applied migrations separately from loading migrations so
+            # that both can be profiled
+            with profiling.phase("query database"):
+                if applied_from:
+                    applied_migrations = _read_snapshot(applied_from)
+                elif databases:
+                    self._applied = _get_applied_migrations(
+                        list(dict.fromkeys([using, *databases])), timeout=timeout
+                    )
+                    applied_migrations = dict(self._applied[using])
+                else:
+                    recorder = django_migration_recorder.MigrationRecorder(connection)
+                    applied_migrations = recorder.applied_migrations()
+
+            with profiling.phase("load migrations"):
+                self._loader = _PreloadedMigrationLoader(connection, applied_migrations)
+
+        if not self._applied:
+            self._applied = {using: self._loader.applied_migrations}
+
         self._graph = self._loader.graph
-        self._executor = django_migration_executor.MigrationExecutor(connection)
+
+        # Executors build another loader and are only needed to collect SQL
+        # in older versions of Django
+        if executor is None and django.VERSION < (3, 1):  # pragma: no cover
+            with profiling.phase("load migrations"):
+                executor = django_migration_executor.MigrationExecutor(
+                    None if applied_from or databases else connection
+                )
+
+        self._executor = executor
         self._docs = MigrationDocs()
+        self._hash_cache = MigrationHashCache(verify=verify_hashes)
+        self._sql_cache = MigrationSQLCache()
+        self._jobs = jobs
 
         self._migrations = {
-            str(node): Migration(
-                node,
-                executor=self._executor,
-                loader=self._loader,
-                docs=self._docs,
+            migration.label: migration
+            for migration in (
+                Migration(
+                    node,
+                    executor=self._executor,
+                    loader=self._loader,
+                    docs=self._docs,
+                    plan=self,
+                )
+                for node in self._graph.nodes.values()
             )
-            for node in self._graph.nodes.values()
         }
 
         # Construct a plan of migrations. Set the ``data`` as the plan so
         # that this datastructure is a list
-        targets = self._graph.leaf_nodes()
-        self.data = []
-        seen = set()
-        for target in targets:
-            for migration in self._graph.forwards_plan(target):
-                if migration not in seen:  # pragma: no branch
-                    # We don't cover the "else" branch of this statement since
-                    # our test models dont have complex enough migrations
-                    self.data.append(self._migrations[str(self._graph.nodes[migration])])
-                    seen.add(migration)
+        self.data = [
+            self._migrations[str(self._graph.nodes[key])]
+            for key in _get_forwards_plan(self._graph)
+        ]
+
+        # Filtered copies share the full plan so that SQL can always be
+        # collected by walking every migration in order
+        self._forwards_plan = list(self.data)
+        self._plan_positions = {
+            migration.label: index for index, migration in enumerate(self._forwards_plan)
+        }
+
+        # Where the last collection of SQL stopped in the plan, with the
+        # project state at that point, and the keys of the SQL cache with the
+        # running digest of the plan up to the last of them. Filtered copies
+        # share the progress so that SQL collected through any of them
+        # continues from there instead of the start of the plan
+        self._sql_progress = {"index": 0, "state": None, "keys": {}, "digest": None}
+
+    @property
+    def databases(self) -> List[str]:
+        """The aliases of the databases with applied migrations"""
+        return list(self._applied)
 
     def __getitem__(self, i):
         """Allow accessing by list index or migration label"""
@@ -214,18 +965,246 @@ class Migrations(utils.FilterableUserList):
         else:
             return self._migrations[i]
 
+    def _replay_state(self, index):
+        """
+        Build the project state after the first ``index`` migrations of the plan
+        without rendering any SQL.
+        """
+        state = ProjectState(real_apps=self._loader.unmigrated_apps)
+        for migration in self._forwards_plan[:index]:
+            state = migration._node.mutate_state(state, preserve=False)
+
+        return state
+
+    def _get_sql_cache_keys(self, labels: Union[Iterable[str], None] = None):
+        """The keys of the SQL of migrations in the SQL cache, keyed on label
+
+        The SQL of a migration is rendered against the project state built by
+        every earlier migration in the plan, including migrations that are
+        not its ancestors. Keys are a running digest of the labels and hashes
+        of the plan up to and including the migration, seeded with the
+        Django version, the database engine and vendor, the unmigrated apps,
+        and the swappable user model. Only the migrations up to the last of
+        ``labels`` are hashed, and keys are computed once per plan.
+
+        Args:
+            labels: The labels of the migrations. Defaults to every
+                migration in the plan.
+        """
+        labels = list(self._migrations if labels is None else labels)
+        progress = self._sql_progress
+        keys = progress["keys"]
+        missing = {label for label in labels if label not in keys}
+        if missing:
+            if progress["digest"] is None:
+                connection = self._loader.connection
+                progress["digest"] = hashlib.md5(
+                    "\n".join(
+                        [
+                            django.get_version(),
+                            connection.settings_dict["ENGINE"],
+                            connection.vendor,
+                            ",".join(sorted(self._loader.unmigrated_apps)),
+                            getattr(settings, "AUTH_USER_MODEL", ""),
+                        ]
+                    ).encode()
+                )
+
+            # Continue the running digest from the last migration with a key
+            prefix = []
+            for migration in self._forwards_plan[len(keys) :]:
+                if not missing:
+                    break
+
+                prefix.append(migration)
+                missing.discard(migration.label)
+
+            self.collect_hashes(prefix)
+            for migration in prefix:
+                progress["digest"].update(f"\n{migration.label}:{migration.hash}".encode())
+                keys[migration.label] = progress["digest"].hexdigest()
+
+        return {label: keys[label] for label in labels}
+
+    @profiling.phased("collect sql")
+    def collect_sql(self, migrations: Union[Iterable[Migration], None] = None) -> None:
+        """Collect SQL for migrations in a single pass over the plan.
+
+        Collecting SQL for one migration in isolation rebuilds the project
+        state from the start of the migration graph. Instead, walk the
+        forwards plan once, carrying the project state forward and only
+        rendering SQL for the requested migrations. The walk resumes from
+        where the last collection stopped when the requested migrations all
+        come after it. The results are cached on the ``sql`` attribute of
+        every requested migration and in the persistent `MigrationSQLCache`,
+        which is consulted before rendering.
+
+        Args:
+            migrations: The migrations for which to collect SQL. Defaults to
+                every migration in the plan.
+        """
+        migrations = self._forwards_plan if migrations is None else migrations
+        pending = set()
+        for migration in migrations:
+            if migration._cached_sql is None:
+                migration._cached_sql = migration._load_stored_sql()
+
+            if migration._cached_sql is None:
+                pending.add(migration.label)
+
+        # Reuse SQL rendered by earlier runs, other checkouts, or other CI jobs
+        cache_keys = {}
+        if pending and self._sql_cache.max_entries:
+            cache_keys = self._get_sql_cache_keys(pending)
+            for label in list(pending):
+                sql = self._sql_cache.get(cache_keys[label])
+                if sql is not None:
+                    self._migrations[label]._cached_sql = sql
+                    pending.remove(label)
+
+        connection = self._loader.connection
+        index, state = self._sql_progress["index"], self._sql_progress["state"]
+        if pending and (
+            state is None or index > min(self._plan_positions[label] for label in pending)
+        ):
+            index, state = 0, ProjectState(real_apps=self._loader.unmigrated_apps)
+
+        while pending:
+            migration = self._forwards_plan[index]
+            index += 1
+            node = migration._node
+            if migration.label not in pending:
+                if state is not None:
+                    # Once models are rendered for a migration, every change
+                    # to the state reloads them, which takes time in the
+                    # number of models. Skipped migrations only change the
+                    # model states, and models are rendered again for the
+                    # next migration with SQL
+                    state.__dict__.pop("apps", None)
+                    try:
+                        with profiling.span("mutate state", migration=migration.label):
+                            state = node.mutate_state(state, preserve=False)
+                    except Exception:
+                        state = None
+                continue
+
+            pending.remove(migration.label)
+            if state is None:
+                # The state could not be carried forward past an earlier
+                # failure. Fall back to collecting SQL in isolation
+                migration._cached_sql = migration._collect_sql()
+                continue
+
+            try:
+                with profiling.span("render sql", migration=migration.label):
+                    with connection.schema_editor(
+                        collect_sql=True, atomic=node.atomic
+                    ) as schema_editor:
+                        state = node.apply(state, schema_editor, collect_sql=True)
+                migration._cached_sql = "\n".join(schema_editor.collected_sql)
+                if cache_keys:
+                    self._sql_cache.set(cache_keys[migration.label], migration._cached_sql)
+            except Exception as exc:
+                migration._cached_sql = _sql_error_msg(exc)
+
+                # The failed migration may have left the state partially
+                # mutated, so rebuild it from the start of the plan
+                try:
+                    state = self._replay_state(index)
+                except Exception:
+                    state = None
+
+        self._sql_progress.update(index=index, state=state)
+        self._sql_cache.save()
+
+    def collect_hashes(self, migrations: Union[Iterable[Migration], None] = None) -> None:
+        """Hash the files of migrations in parallel.
+
+        Files are read and hashed by a pool of threads since hashing many
+        files is usually bound by I/O latency. The results are cached on the
+        ``hash`` attribute of every migration.
+
+        Args:
+            migrations: The migrations to hash. Defaults to every migration
+                in the list.
+        """
+        migrations = self if migrations is None else migrations
+        paths = {}
+        for migration in migrations:
+            if migration._cached_hash is None:
+                path = migration._get_cacheable_path()
+                if path:
+                    paths[migration] = path
+
+        digests = self._hash_cache.digest_many(
+            paths.values(), jobs=self._jobs, kind=_get_fingerprint_kind()
+        )
+        for migration, path in paths.items():
+            migration._cached_hash = digests[path]
+
     def filter_by_missing_docs(self):
-        """Filter migration docs by ones that are missing"""
-        return self.intersect("label", set(self._migrations) - set(self._docs))
+        """Filter migration docs by ones that are missing
+
+        Only the docs shards of the apps of migrations in the list are loaded.
+        """
+        return self.intersect(
+            "label", {migration.label for migration in self if migration.label not in self._docs}
+        )
+
+    def _get_documented(self):
+        """The docs of migrations in the list that have docs, keyed on label"""
+        documented = {}
+        for migration in self:
+            docs = self._docs.get(migration.label)
+            if docs is not None:
+                documented[migration.label] = docs
+
+        return documented
 
     def filter_by_stale_docs(self):
-        """Filter migration docs by ones that are stale"""
+        """Filter migration docs by ones that are stale
+
+        Docs are compared against the kind of fingerprint stored in them,
+        so changing the ``MIGRATION_DOCS_FINGERPRINT`` setting doesn't make
+        docs stale.
+        """
+        documented = self._get_documented()
+        kind = _get_fingerprint_kind()
+        self.collect_hashes(
+            self._migrations[label]
+            for label, docs in documented.items()
+            if _get_hash_kind(docs["_hash"]) == kind
+        )
         labels = [
-            migration
-            for migration, docs in self._docs.items()
-            if docs is not None
-            and migration in self._migrations
-            and docs["_hash"] != self._migrations[migration].hash
+            label
+            for label, docs in documented.items()
+            if docs["_hash"] != self._migrations[label]._hash_as(_get_hash_kind(docs["_hash"]))
+        ]
+        return self.intersect("label", labels)
+
+    def filter_by_other_fingerprints(self):
+        """
+        Filter migration docs by ones with a different kind of fingerprint
+        than the configured ``MIGRATION_DOCS_FINGERPRINT``
+        """
+        kind = _get_fingerprint_kind()
+        labels = [
+            label
+            for label, docs in self._get_documented().items()
+            if _get_hash_kind(docs["_hash"]) != kind
+        ]
+        return self.intersect("label", labels)
+
+    def filter_by_other_sql_store(self):
+        """
+        Filter migration docs by ones with SQL in a different store than the
+        configured ``MIGRATION_DOCS_SQL_STORE``
+        """
+        store = _get_sql_store()
+        labels = [
+            label
+            for label, docs in self._get_documented().items()
+            if _get_docs_sql_store(docs) not in (None, store)
         ]
         return self.intersect("label", labels)
 
@@ -243,7 +1222,7 @@ class Migrations(utils.FilterableUserList):
 
     def bootstrap_docs(self):
         """Bootstraps all migration docs to empty values."""
-        self._docs = MigrationDocs(data={str(node): None for node in self})
+        self._docs.data = {str(node): None for node in self}
         self._docs.save()
 
 
@@ -253,29 +1232,125 @@ class MigrationDocs(collections.UserDict):
         Represents migration docs as a dictionary. Reads and persists docs as
         YAML.
 
+        Docs are either stored in a single ``.migration-docs/docs.yaml``
+        file or sharded in one ``.migration-docs/docs/{app_label}.yaml``
+        file per app. Shards are loaded lazily when the docs of one of their
+        migrations are accessed, and only changed shards are saved.
+
         Args:
             msg: Function for printing messages to the user.
             data: Data to use as migration docs. If None,
                 load migration docs from the docs.yaml file.
         """
         self._msg = msg
+        self._batch_depth = 0
+        self._batch_dirty = False
+
+        # The raw contents of every loaded shard, keyed on app label, or None
+        # if the shard does not exist yet
+        self._shard_texts = {}
+        self._sharded = os.path.isdir(_get_migration_docs_file_path("docs"))
+        if self._sharded and os.path.exists(_get_migration_docs_file_path("docs.yaml")):
+            raise RuntimeError(
+                "django-migration-docs: Found both .migration-docs/docs.yaml and"
+                " .migration-docs/docs/. Please remove one of them."
+            )
 
+        self._data = {}
         if not data:
-            docs_file = _get_migration_docs_file_path("docs.yaml")
-            try:
-                with open(docs_file, "r") as f:
-                    self.data = yaml.safe_load(f)
-            except IOError:
-                self.data = {}
-            except Exception as exc:
-                raise RuntimeError(
-                    "django-migration-docs: docs.yaml is corrupt and cannot"
-                    " be parsed as YAML. Please fix the"
-                    " .migration-docs/docs.yaml file."
-                ) from exc
+            if not self._sharded:
+                self._data = self._read("docs.yaml")[0]
         else:
             self.data = data
 
+    @property
+    def data(self) -> dict:
+        """All migration docs keyed on migration label. Loads every shard"""
+        for app_label in self._shard_app_labels():
+            self._load_shard(app_label)
+
+        return self._data
+
+    @data.setter
+    def data(self, data: dict) -> None:
+        # Track every shard so that shards of removed apps are deleted on save
+        for app_label in self._shard_app_labels():
+            self._load_shard(app_label)
+
+        self._data = data
+        if self._sharded:
+            for app_label in {_get_app_label(label) for label in data}:
+                self._shard_texts.setdefault(app_label, None)
+
+    @profiling.phased("parse docs")
+    def _read(self, file_name):
+        """Read and parse a docs file. Return the docs and the raw file contents
+
+        Parsed docs are stored in a compiled index in the cache directory.
+        The index is used instead of parsing the YAML until the docs file
+        changes.
+        """
+        try:
+            with open(_get_migration_docs_file_path(file_name), "rb") as f:
+                raw = f.read()
+                key = _get_docs_index_key(raw, os.fstat(f.fileno()))
+        except IOError:
+            return {}, None
+
+        text = raw.decode().replace("\r\n", "\n")
+        data = _read_docs_index(file_name, key)
+        if data is not None:
+            return data, text
+
+        try:
+            data = yaml.load(text, Loader=_YamlLoader) or {}
+        except Exception as exc:
+            raise RuntimeError(
+                f"django-migration-docs: {file_name} is corrupt and cannot"
+                " be parsed as YAML. Please fix the"
+                f" .migration-docs/{file_name} file."
+            ) from exc
+
+        _write_docs_index(file_name, key, data)
+        return data, text
+
+    def _shard_app_labels(self):
+        """The app labels of every shard on disk"""
+        if not self._sharded or not os.path.isdir(_get_migration_docs_file_path("docs")):
+            return []
+
+        return sorted(
+            file_name[: -len(".yaml")]
+            for file_name in os.listdir(_get_migration_docs_file_path("docs"))
+            if file_name.endswith(".yaml")
+        )
+
+    def _load_shard(self, app_label):
+        """Load the shard of an app if it hasn't been loaded"""
+        if self._sharded and app_label not in self._shard_texts:
+            shard, self._shard_texts[app_label] = self._read(f"docs/{app_label}.yaml")
+            self._data.update(shard)
+
+    def __getitem__(self, label):
+        self._load_shard(_get_app_label(label))
+        return self._data[label]
+
+    def __setitem__(self, label, docs):
+        self._load_shard(_get_app_label(label))
+        self._data[label] = docs
+
+    def __delitem__(self, label):
+        self._load_shard(_get_app_label(label))
+        del self._data[label]
+
+    def __contains__(self, label):
+        self._load_shard(_get_app_label(label))
+        return label in self._data
+
+    def get(self, label, default=None):
+        self._load_shard(_get_app_label(label))
+        return self._data.get(label, default)
+
     @cached_property
     def schema(self) -> formaldict.Schema:
         """Loads the migration doc schema
@@ -285,7 +1360,7 @@ class MigrationDocs(collections.UserDict):
         """
         try:
             with open(_get_migration_docs_file_path("migration.yaml"), "r") as f:
-                schema = yaml.safe_load(f)
+                schema = yaml.load(f, Loader=_YamlLoader)
         except IOError:
             schema = [
                 {
@@ -307,25 +1382,483 @@ class MigrationDocs(collections.UserDict):
 
         return formaldict.Schema(schema)
 
+    @contextlib.contextmanager
+    def batch(self):
+        """Defer saving docs until the end of the block.
+
+        Docs are saved once when the outermost block exits, including when
+        it exits because of an error or an interrupted prompt, so that
+        progress is never lost.
+
+        Example:
+            Update docs of many migrations with one write:
+
+                with docs.batch():
+                    for migration in migrations:
+                        migration.set_docs(prompt=False)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_dirty:
+                self._batch_dirty = False
+                self.save()
+
     def save(self) -> None:
         """Save all migration docs
 
         Ensure docs are ordered when persisted to keep YAML consistently
-        ordered
+        ordered. Inside of a `MigrationDocs.batch` block, saving is deferred
+        until the block exits.
         """
-        docs_file = _get_migration_docs_file_path("docs.yaml")
-
-        yaml.Dumper.add_representer(
-            collections.OrderedDict,
-            lambda dumper, data: dumper.represent_mapping("tag:yaml.org,2002:map", data.items()),
-        )
-        ordered_docs = collections.OrderedDict(
-            (label, docs) for label, docs in sorted(self.data.items())
+        if self._batch_depth:
+            self._batch_dirty = True
+        else:
+            self._write()
+
+    def _write(self) -> None:
+        """Write all migration docs to the docs file or to changed shards"""
+        if not self._sharded:
+            _write_docs_file("docs.yaml", self.data)
+            return
+
+        shards = collections.defaultdict(dict)
+        for label, docs in self._data.items():
+            shards[_get_app_label(label)][label] = docs
+
+        for app_label, text in self._shard_texts.items():
+            shard_file_name = f"docs/{app_label}.yaml"
+            if app_label in shards:
+                self._shard_texts[app_label] = _write_docs_file(
+                    shard_file_name, shards[app_label], text
+                )
+            elif text is not None:
+                os.remove(_get_migration_docs_file_path(shard_file_name))
+                self._shard_texts[app_label] = None
+
+
+def _get_migration_dirs():
+    """
+    The directories of the migrations packages of installed apps, keyed on
+    app label. Migration modules are not imported.
+    """
+    migration_dirs = {}
+    for app_config in apps.get_app_configs():
+        module_name, _ = django_migration_loader.MigrationLoader.migrations_module(
+            app_config.label
         )
-        yaml_str = yaml.dump(ordered_docs, Dumper=yaml.Dumper)
-        pathlib.Path(docs_file).parent.mkdir(parents=True, exist_ok=True)
-        with open(docs_file, "w+") as f:
-            f.write(yaml_str)
+        if module_name is None:
+            continue
+
+        # Finding the spec of the migrations package imports the app
+        # package, which is already loaded, but not the migrations
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except ModuleNotFoundError:
+            continue
+
+        # Skip apps with no migrations package or a namespace package,
+        # just like the migration loader
+        if spec is None or spec.submodule_search_locations is None or not spec.has_location:
+            continue
+
+        migration_dirs[app_config.label] = list(spec.submodule_search_locations)
+
+    return migration_dirs
+
+
+def _git(*args):
+    """Run a git command and return its output"""
+    return subprocess.run(["git", *args], check=True, capture_output=True, text=True).stdout
+
+
+def _get_git_changed_files(ref):
+    """
+    The absolute paths of files that differ between the working tree and a
+    git ref, including deleted, renamed, and untracked files.
+    """
+    try:
+        root = _git("rev-parse", "--show-toplevel").strip()
+        # Renames are listed as a deletion and an addition so that the docs
+        # of the old paths are reported as excess
+        changed = _git("diff", "--name-only", "--no-renames", "-z", ref, "--").split("\0")
+        untracked = _git("ls-files", "--others", "--exclude-standard", "--full-name", "-z")
+    except (OSError, subprocess.CalledProcessError) as exc:
+        details = getattr(exc, "stderr", None) or str(exc)
+        raise RuntimeError(
+            f'django-migration-docs: Could not find files changed since "{ref}"'
+            f" with git: {details.strip()}"
+        ) from exc
+
+    return [os.path.join(root, path) for path in [*changed, *untracked.split("\0")] if path]
+
+
+class MigrationFiles(collections.UserDict):
+    def __init__(
+        self,
+        verify_hashes: bool = False,
+        jobs: Union[int, None] = None,
+        paths: Union[Iterable[str], None] = None,
+        hash_cache: Union["MigrationHashCache", None] = None,
+    ):
+        """
+        Maps the labels of migrations to the paths of their files.
+
+        Unlike `Migrations`, migration files are found on disk from the
+        installed apps without importing migration modules or connecting to
+        the database. It is only capable of checking the docs of migrations.
+
+        Squashed migrations are assumed to replace the migrations they squash,
+        which is how Django loads them when none or all of the replaced
+        migrations have been applied. The replaced migrations are cached in
+        the hash cache, so only files that changed are read.
+
+        Args:
+            verify_hashes: Re-hash every migration file instead of trusting
+                hashes in the cache for files that have not changed.
+            jobs: The number of threads used to hash migration files.
+                Defaults to the default of `concurrent.futures.ThreadPoolExecutor`.
+            paths: Only consider these files, such as the files changed by
+                a commit. Paths that are not migration files are ignored.
+                Migrations of deleted files, and migrations replaced by
+                squashed migrations in these files, are reported by
+                ``excess_docs`` if they have docs.
+            hash_cache: A hash cache to share between instances instead of
+                loading it from the cache directory.
+        """
+        self._docs = MigrationDocs()
+        self._hash_cache = hash_cache or MigrationHashCache(verify=verify_hashes)
+        self._jobs = jobs
+        self._removed = None if paths is None else set()
+        self.data = {}
+
+        with profiling.phase("find migration files"):
+            migration_dirs = _get_migration_dirs()
+            if paths is None:
+                files = self._find_files(migration_dirs)
+            else:
+                files = self._find_changed_files(migration_dirs, paths)
+
+            replaced = set()
+            for label, path in files:
+                if not os.path.isfile(path):
+                    # Deleted files are only found when checking changed files
+                    self._removed.add(label)
+                    continue
+
+                self.data[label] = path
+                replaced.update(self._hash_cache.replaces(path))
+
+            for label in replaced:
+                self.data.pop(label, None)
+                if self._removed is not None:
+                    self._removed.add(label)
+
+    def _find_files(self, migration_dirs):
+        """Find the labels and paths of every migration file"""
+        for app_label, dirs in migration_dirs.items():
+            for module_info in pkgutil.iter_modules(dirs):
+                if module_info.ispkg or module_info.name[0] in "_~":
+                    continue
+
+                # Sourceless migrations cannot be hashed
+                finder_path = getattr(module_info.module_finder, "path", "")
+                path = os.path.join(finder_path, f"{module_info.name}.py")
+                if not os.path.isfile(path):  # pragma: no cover
+                    continue
+
+                yield f"{app_label}.{module_info.name}", path
+
+    def _find_changed_files(self, migration_dirs, paths):
+        """Find the labels and paths of the migration files among the given paths"""
+        app_labels = {
+            os.path.realpath(migration_dir): app_label
+            for app_label, dirs in migration_dirs.items()
+            for migration_dir in dirs
+        }
+        for path in dict.fromkeys(os.path.realpath(path) for path in paths):
+            migration_dir, file_name = os.path.split(path)
+            name, ext = os.path.splitext(file_name)
+            if migration_dir in app_labels and ext == ".py" and name[0] not in "_~":
+                yield f"{app_labels[migration_dir]}.{name}", path
+
+    def filter_by_missing_docs(self) -> List[str]:
+        """The labels of migrations that are missing docs"""
+        return sorted(set(self) - set(self._docs))
+
+    def filter_by_stale_docs(self) -> List[str]:
+        """The labels of migrations that have stale docs"""
+        documented = {
+            label: docs for label, docs in self._docs.items() if docs is not None and label in self
+        }
+        by_kind = collections.defaultdict(list)
+        for label, docs in documented.items():
+            by_kind[_get_hash_kind(docs["_hash"])].append(label)
+
+        stale = []
+        for kind, labels in by_kind.items():
+            digests = self._hash_cache.digest_many(
+                (self[label] for label in labels), jobs=self._jobs, kind=kind
+            )
+            stale += [
+                label for label in labels if documented[label]["_hash"] != digests[self[label]]
+            ]
+
+        return sorted(stale)
+
+    @property
+    def excess_docs(self):
+        """Return additional docs"""
+        if self._removed is not None:
+            return {label for label in self._removed if label in self._docs}
+
+        return set(self._docs) - set(self)
+
+
+class MigrationHashCache(collections.UserDict):
+    # Bump when the format of the cache file or of fingerprints changes
+    version = 4
+
+    def __init__(self, verify: bool = False):
+        """
+        Caches hashes of migration files. Maps the path of every file to its
+        ``(mtime_ns, size, inode, digests, replaces)``, where ``digests`` maps
+        kinds of fingerprints to hashes and ``replaces`` holds the labels of
+        the migrations replaced by a squashed migration, or None if the file
+        hasn't been parsed yet. Files are only read again when their stat
+        metadata changes.
+
+        Args:
+            verify: Ignore cached hashes and hash every file again. The cache
+                is still refreshed with the new hashes.
+        """
+        self._dirty = False
+        self.data = {}
+
+        if not verify:
+            try:
+                with open(_get_migration_docs_cache_path("hashes.json"), "r") as f:
+                    cache = json.load(f)
+
+                if cache["version"] == self.version:
+                    self.data = cache["hashes"]
+            except Exception:
+                # A missing or unreadable cache is rebuilt from scratch
+                pass
+
+    def digest(self, path: str, kind: Union[str, None] = None) -> str:
+        """Return the hash of a migration file, reading it only if it changed
+
+        Args:
+            path: The path of the migration file.
+            kind: The kind of fingerprint. Defaults to the configured
+                ``MIGRATION_DOCS_FINGERPRINT``.
+        """
+        kind = kind or _get_fingerprint_kind()
+        key, cached = self._get_entry(path)
+        digests = cached[3] if cached else {}
+        if kind in digests:
+            return digests[kind]
+
+        with profiling.span("hash file", path=path, kind=kind):
+            digest = _hash_source(_read_source(path), kind=kind)
+
+        self._set_entry(path, key, {**digests, kind: digest}, cached[4] if cached else None)
+        return digest
+
+    def replaces(self, path: str) -> List[str]:
+        """
+        Return the labels of the migrations replaced by a migration file,
+        reading it only if it changed. Only squashed migrations replace
+        other migrations.
+        """
+        key, cached = self._get_entry(path)
+        if cached and cached[4] is not None:
+            return cached[4]
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        replaces = _parse_replaces(data) if b"replaces" in data else []
+        self._set_entry(path, key, cached[3] if cached else {}, replaces)
+        return replaces
+
+    def _get_entry(self, path):
+        """The stat key of a file and its cached entry if the file hasn't changed"""
+        stat = os.stat(path)
+        key = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+        cached = self.data.get(path)
+        return key, cached if cached and cached[:3] == key else None
+
+    def _set_entry(self, path, key, digests, replaces):
+        # Files modified within the mtime granularity of the filesystem could
+        # change again without changing their stat metadata. Don't trust
+        # them until they settle
+        if time.time_ns() - key[0] > 2_000_000_000:
+            self.data[path] = [*key, digests, replaces]
+            self._dirty = True
+
+    @profiling.phased("hash migrations")
+    def digest_many(
+        self, paths: Iterable[str], jobs: Union[int, None] = None, kind: Union[str, None] = None
+    ) -> Dict[str, str]:
+        """Return the hashes of many migration files, keyed by path.
+
+        Files are stat'ed, read, and hashed in a pool of threads.
+
+        Args:
+            paths: The paths of the migration files.
+            jobs: The number of threads. Defaults to the default of
+                `concurrent.futures.ThreadPoolExecutor`. Files are hashed in
+                the calling thread when 1.
+            kind: The kind of fingerprint. Defaults to the configured
+                ``MIGRATION_DOCS_FINGERPRINT``.
+        """
+        kind = kind or _get_fingerprint_kind()
+        paths = list(dict.fromkeys(paths))
+        if jobs == 1 or len(paths) <= 1:
+            return {path: self.digest(path, kind=kind) for path in paths}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            digests = executor.map(lambda path: self.digest(path, kind=kind), paths)
+            return dict(zip(paths, digests))
+
+    @profiling.phased("save cache")
+    def save(self) -> None:
+        """Save the cache if any hashes were added or changed"""
+        if not self._dirty:
+            return
+
+        # Forget about migration files that have been deleted
+        self.data = {path: entry for path, entry in self.data.items() if os.path.exists(path)}
+
+        try:
+            with open(_make_migration_docs_cache_root() / "hashes.json", "w+") as f:
+                json.dump({"version": self.version, "hashes": self.data}, f)
+        except OSError:
+            # Hashes are only cached when the cache directory can be written
+            return
+
+        self._dirty = False
+
+
+class MigrationSQLCache:
+    # Bump when the format of cached SQL changes
+    version = 1
+
+    def __init__(self, max_entries: Union[int, None] = None):
+        """
+        Caches the SQL of migrations in ``sql/{key}.sql`` files in the cache
+        directory. Rendering SQL is deterministic, so SQL is shared by every
+        run that renders the same migration after the same migrations with
+        the same Django version and database. See
+        `Migrations._get_sql_cache_keys`.
+
+        The cache is bounded by evicting the least recently used entries.
+        The modification time of an entry is updated whenever it is used.
+
+        Args:
+            max_entries: The maximum number of cached SQL entries. Defaults
+                to the ``MIGRATION_DOCS_SQL_CACHE_SIZE`` setting, or 10,000.
+                The cache is disabled when 0.
+        """
+        if max_entries is None:
+            max_entries = getattr(settings, "MIGRATION_DOCS_SQL_CACHE_SIZE", 10_000)
+
+        self.max_entries = max_entries
+        self._dirty = False
+
+    def _get_path(self, key):
+        return os.path.join(_get_migration_docs_cache_root(), "sql", f"{key}-v{self.version}.sql")
+
+    def get(self, key: str) -> Union[str, None]:
+        """Return cached SQL, or None if it isn't cached"""
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                sql = f.read().decode()
+
+            os.utime(path)
+        except OSError:
+            return None
+
+        return sql
+
+    def set(self, key: str, sql: str) -> None:
+        """Cache SQL, unless the cache directory can't be written"""
+        path = pathlib.Path(self._get_path(key))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _make_migration_docs_cache_root()
+
+            # Write atomically so that concurrent processes never read partial SQL
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(sql.encode())
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self._dirty = True
+
+    @profiling.phased("save cache")
+    def save(self) -> None:
+        """Evict the least recently used entries if any SQL was added"""
+        if not self._dirty:
+            return
+
+        self._dirty = False
+        sql_root = os.path.join(_get_migration_docs_cache_root(), "sql")
+        entries = []
+        for entry in os.scandir(sql_root):
+            if entry.name.endswith(".sql"):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:  # pragma: no cover
+                    # Evicted by a concurrent process
+                    pass
+
+        entries.sort()
+        for _, path in entries[: max(len(entries) - self.max_entries, 0)]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+def convert(layout: str, msg: Callable = _pretty_msg) -> None:
+    """
+    Convert migration docs between the single-file layout, where docs are
+    stored in ``.migration-docs/docs.yaml``, and the sharded layout, where
+    docs are stored in one ``.migration-docs/docs/{app_label}.yaml`` file
+    per app.
+
+    Args:
+        layout: The layout to convert to. Either "single" or "sharded".
+        msg: A message printer for showing messages to the user.
+
+    Raises:
+        ValueError: When the layout is invalid.
+    """
+    if layout not in ("single", "sharded"):
+        raise ValueError(f'Invalid layout "{layout}". Must be "single" or "sharded".')
+
+    docs = MigrationDocs()
+    if docs._sharded == (layout == "sharded"):
+        msg(f"django-migration-docs: Docs already use the {layout} layout.")
+        return
+
+    data = docs.data
+    if layout == "sharded":
+        docs._sharded = True
+        docs.data = data
+        docs.save()
+        os.remove(_get_migration_docs_file_path("docs.yaml"))
+    else:
+        docs._sharded = False
+        docs.save()
+        shutil.rmtree(_get_migration_docs_file_path("docs"))
+
+    msg(f"django-migration-docs: Converted docs to the {layout} layout.")
 
 
 def bootstrap(msg: Callable = _pretty_msg) -> None:
@@ -347,13 +1880,27 @@ def bootstrap(msg: Callable = _pretty_msg) -> None:
     msg("django-migration-docs: Docs successfully bootstrapped.")
 
 
-def sync(msg: Callable = _pretty_msg) -> None:
+def sync(
+    msg: Callable = _pretty_msg,
+    verify_hashes: bool = False,
+    jobs: Union[int, None] = None,
+    using: str = "default",
+    labels: Union[Iterable[str], None] = None,
+) -> None:
     """
     Sync new migrations with the migration docs and prune migrations that
     no longer exist.
 
     Args:
         msg: A message printer for showing messages to the user.
+        verify_hashes: Re-hash every migration file instead of using the
+            hash cache.
+        jobs: The number of threads used to hash migration files.
+        using: The database alias used to determine applied migrations.
+        labels: Only sync the stale docs of these migrations (e.g. the
+            migrations about to be applied). Docs are still added for every
+            migration that is missing them. Docs of deleted migrations and
+            unreferenced SQL blobs are left for the next full sync.
     """
     # Run any configured pre-sync hooks
     pre_sync_hooks = getattr(settings, "MIGRATION_DOCS_PRE_SYNC_HOOKS", [])
@@ -361,42 +1908,111 @@ def sync(msg: Callable = _pretty_msg) -> None:
         msg("django-migration-docs: Running pre-sync hooks...")
         for pre_sync_hook in pre_sync_hooks:
             msg(pre_sync_hook, fg="yellow")
-            utils.shell(pre_sync_hook)
+            with profiling.phase("pre-sync hooks", command=pre_sync_hook):
+                utils.shell(pre_sync_hook)
+
+    migrations = Migrations(using=using, verify_hashes=verify_hashes, jobs=jobs)
+    synced = migrations if labels is None else migrations.intersect("label", set(labels))
+
+    # Write docs once at the end. Docs are still written if a prompt is
+    # interrupted so that progress isn't lost
+    with migrations._docs.batch():
+        missing_docs = migrations.filter_by_missing_docs()
+        stale_docs = synced.filter_by_stale_docs()
+        stale_labels = {migration.label for migration in stale_docs}
+        refingerprinted_docs = [
+            migration
+            for migration in synced.filter_by_other_fingerprints()
+            if migration.label not in stale_labels
+        ]
+        moved_docs = [
+            migration
+            for migration in synced.filter_by_other_sql_store()
+            if migration.label not in stale_labels
+        ]
+        excess_docs = migrations.excess_docs if labels is None else set()
+        migrations.collect_hashes([*missing_docs, *refingerprinted_docs])
+        migrations.collect_sql([*missing_docs, *stale_docs])
+
+        # Collect information for new migrations
+        if missing_docs:
+            msg(
+                "django-migration-docs: Found no docs for"
+                f" {len(missing_docs)} migration(s). Please enter"
+                " more information."
+            )
+            for migration in missing_docs:
+                msg(f"{migration.label}:", fg="yellow")
+                migration.set_docs()
+
+        # Update any stale documentation
+        if stale_docs:
+            msg(
+                f"django-migration-docs: Found {len(stale_docs)} stale"
+                " migration doc(s). Docs updated automatically."
+            )
+            for migration in stale_docs:
+                migration.set_docs(prompt=False)
+
+        # Switch up-to-date docs to the configured kind of fingerprint
+        # without collecting their SQL again
+        if refingerprinted_docs:
+            msg(
+                f"django-migration-docs: Updated the fingerprints of"
+                f" {len(refingerprinted_docs)} migration doc(s)."
+            )
+            for migration in refingerprinted_docs:
+                migrations._docs[migration.label] = {
+                    **migrations._docs[migration.label],
+                    "_hash": migration.hash,
+                }
+
+            migrations._docs.save()
+
+        # Move the SQL of up-to-date docs to the configured SQL store
+        if moved_docs:
+            msg(
+                f"django-migration-docs: Moved the SQL of {len(moved_docs)}"
+                f" migration doc(s) to the {_get_sql_store()} SQL store."
+            )
+            for migration in moved_docs:
+                docs = migrations._docs[migration.label]
+                sql = _load_sql(docs)
+                migrations._docs[migration.label] = _store_sql(
+                    docs, migration.sql if sql is None else sql
+                )
+
+            migrations._docs.save()
+
+        # Delete old migrations
+        if excess_docs:
+            msg(
+                f"django-migration-docs: Found docs for {len(excess_docs)}"
+                " deleted migration(s). Docs were removed."
+            )
+            migrations.prune_excess_docs()
 
-    migrations = Migrations()
-    missing_docs = migrations.filter_by_missing_docs()
-    stale_docs = migrations.filter_by_stale_docs()
-    excess_docs = migrations.excess_docs
+    migrations._hash_cache.save()
+    if labels is None:
+        gc(msg=msg, docs=migrations._docs)
 
-    # Collect information for new migrations
-    if missing_docs:
-        msg(
-            "django-migration-docs: Found no docs for"
-            f" {len(missing_docs)} migration(s). Please enter"
-            " more information."
-        )
-        for migration in missing_docs:
-            msg(f"{migration.label}:", fg="yellow")
-            migration.set_docs()
+    msg("django-migration-docs: Successfully synced migration docs.")
 
-    # Update any stale documentation
-    if stale_docs:
-        msg(
-            f"django-migration-docs: Found {len(stale_docs)} stale"
-            " migration doc(s). Docs updated automatically."
-        )
-        for migration in stale_docs:
-            migration.set_docs(prompt=False)
 
-    # Delete old migrations
-    if excess_docs:
-        msg(
-            f"django-migration-docs: Found docs for {len(excess_docs)}"
-            " deleted migration(s). Docs were removed."
-        )
-        migrations.prune_excess_docs()
+def gc(msg: Callable = _pretty_msg, docs: Union["MigrationDocs", None] = None) -> None:
+    """
+    Remove SQL blobs in ``.migration-docs/sql`` that are no longer
+    referenced by any migration docs. Blobs are orphaned when the SQL of
+    a migration changes or a migration is deleted.
 
-    msg("django-migration-docs: Successfully synced migration docs.")
+    Args:
+        msg: A message printer for showing messages to the user.
+        docs: The migration docs. Loaded from the docs files by default.
+    """
+    docs = MigrationDocs() if docs is None else docs
+    num_removed = _prune_sql_blobs(docs.data)
+    if num_removed:
+        msg(f"django-migration-docs: Removed {num_removed} unreferenced SQL blob(s).")
 
 
 def update(migrations: List[str], msg: Callable = _pretty_msg) -> None:
@@ -408,15 +2024,26 @@ def update(migrations: List[str], msg: Callable = _pretty_msg) -> None:
         msg: A message printer for showing messages to the user.
     """
     migration_objs = Migrations()
-    for migration in migrations:
-        msg(f"{migration}:", fg="yellow")
-        try:
-            migration_objs[migration].set_docs()
-        except KeyError:
-            msg(f'Migration with label "{migration}" does not exist.', fg="red")
-
-
-def check(msg: Callable = _pretty_msg) -> bool:
+    migration_objs.collect_sql(
+        migration_objs[label] for label in migrations if label in migration_objs._migrations
+    )
+    with migration_objs._docs.batch():
+        for migration in migrations:
+            msg(f"{migration}:", fg="yellow")
+            try:
+                migration_objs[migration].set_docs()
+            except KeyError:
+                msg(f'Migration with label "{migration}" does not exist.', fg="red")
+
+
+def check(
+    msg: Callable = _pretty_msg,
+    verify_hashes: bool = False,
+    fast: bool = False,
+    jobs: Union[int, None] = None,
+    since: Union[str, None] = None,
+    files: Union[List[str], None] = None,
+) -> bool:
     """
     Check migration notes. Return False if any of the conditions hold true:
     - There are migrations without docs.
@@ -425,14 +2052,38 @@ def check(msg: Callable = _pretty_msg) -> bool:
 
     Args:
         msg: A message printer for showing messages to the user.
+        verify_hashes: Re-hash every migration file instead of using the
+            hash cache.
+        fast: Find and hash migration files on disk without importing
+            migrations or connecting to the database.
+        jobs: The number of threads used to hash migration files.
+        since: Only check migration files that changed since this git ref,
+            including uncommitted and untracked files. Implies ``fast``.
+        files: Only check these migration files. Implies ``fast``.
 
     Returns:
         `True` when the migration docs are up to date, `False` otherwise.
     """
-    migrations = Migrations()
+    if since is not None or files is not None:
+        paths = list(files or [])
+        if since is not None:
+            paths += _get_git_changed_files(since)
+
+        migrations = MigrationFiles(verify_hashes=verify_hashes, jobs=jobs, paths=paths)
+    elif fast:
+        migrations = MigrationFiles(verify_hashes=verify_hashes, jobs=jobs)
+    else:
+        migrations = Migrations(verify_hashes=verify_hashes, jobs=jobs)
+
+    return _check_migrations(migrations, msg)
+
+
+def _check_migrations(migrations, msg):
+    """Report missing, stale, and excess docs. Return True if there are none"""
     missing_docs = migrations.filter_by_missing_docs()
     stale_docs = migrations.filter_by_stale_docs()
     excess_docs = migrations.excess_docs
+    migrations._hash_cache.save()
 
     if missing_docs:
         msg(
@@ -463,11 +2114,125 @@ def check(msg: Callable = _pretty_msg) -> bool:
         return True
 
 
+def _get_watched_files(migration_dirs):
+    """
+    The modification times and sizes of migration files and docs files,
+    keyed on path
+    """
+    directories = [
+        *(migration_dir for dirs in migration_dirs.values() for migration_dir in dirs),
+        _get_migration_docs_file_root(),
+        _get_migration_docs_file_path("docs"),
+    ]
+    watched = {}
+    for directory in directories:
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.name.endswith((".py", ".yaml")) and entry.is_file():
+                    stat = entry.stat()
+                    watched[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+    return watched
+
+
+def watch(
+    msg: Callable = _pretty_msg,
+    interval: float = 1.0,
+    jobs: Union[int, None] = None,
+    polls: Union[int, None] = None,
+) -> None:
+    """
+    Check migration docs every time migration files or docs change.
+
+    Django is only set up once. Like ``check --fast``, migration files are
+    found without importing migrations or connecting to the database.
+    Hashes are kept in memory between checks, so only changed migration
+    files are hashed again. Changes are found by polling the modification
+    times of files in the migrations packages and ``.migration-docs``.
+    Errors, such as corrupt docs while they are edited, are shown and
+    watching continues.
+
+    Args:
+        msg: A message printer for showing messages to the user.
+        interval: The number of seconds between polls.
+        jobs: The number of threads used to hash migration files.
+        polls: Stop after polling this many times. Polls until interrupted
+            by default.
+    """
+    hash_cache = MigrationHashCache()
+    migration_dirs = _get_migration_dirs()
+    watched = None
+    msg("django-migration-docs: Watching migration files and docs for changes.")
+
+    num_polls = 0
+    while polls is None or num_polls < polls:
+        if num_polls:
+            time.sleep(interval)
+
+        num_polls += 1
+
+        # Files can be half-written or replaced while they are edited, so
+        # errors are reported and checked again when the files change
+        try:
+            current = _get_watched_files(migration_dirs)
+            if current == watched:
+                continue
+
+            watched = current
+            start = time.perf_counter()
+            migrations = MigrationFiles(jobs=jobs, hash_cache=hash_cache)
+            _check_migrations(migrations, msg)
+            msg(
+                f"django-migration-docs: Checked {len(migrations)} migration(s) in"
+                f" {(time.perf_counter() - start) * 1000:.0f}ms.",
+                fg="yellow",
+            )
+        except Exception as exc:
+            msg(str(exc), fg="red")
+
+
+def snapshot(path: str, using: str = "default", msg: Callable = _pretty_msg) -> None:
+    """
+    Export the migrations applied to a database to a snapshot file. The
+    snapshot can be used to show docs without access to the database.
+
+    Args:
+        path: The path of the snapshot file.
+        using: The alias of the database.
+        msg: A message printer for showing messages to the user.
+    """
+    applied = collections.defaultdict(list)
+    recorder = django_migration_recorder.MigrationRecorder(connections[using])
+    for app_label, name in sorted(recorder.applied_migrations()):
+        applied[app_label].append(name)
+
+    with open(path, "w+") as f:
+        json.dump(
+            {"version": SNAPSHOT_VERSION, "database": using, "applied": applied},
+            f,
+            separators=(",", ":"),
+        )
+
+    msg(
+        f"django-migration-docs: Saved {sum(len(names) for names in applied.values())}"
+        f' applied migration(s) of the "{using}" database to {path}.'
+    )
+
+
 def show(
     app_labels: Union[List[str], None] = None,
     unapplied: bool = False,
     style: str = "default",
-) -> str:
+    stream: bool = False,
+    applied_from: Union[str, None] = None,
+    databases: Union[List[str], str, None] = None,
+    timeout: Union[float, None] = None,
+) -> Union[str, Iterator[str]]:
     """Shows migration docs to the user
 
     Args:
@@ -475,11 +2240,21 @@ def show(
         unapplied: Only show unapplied migrations.
         style: The style to use when rendering. Corresponds to a Jinja template stored in
             `.migration-docs/{style}_show.tpl`.
+        stream: Return an iterator of chunks of the rendered migration list
+            instead of one string. Chunks are rendered as they are consumed,
+            which avoids holding large outputs in memory.
+        applied_from: The path of a snapshot file created with `snapshot`
+            to read applied migrations from instead of the database.
+        databases: Database aliases, or "all" for every database, to query
+            applied migrations of concurrently. The applied status of each
+            migration on every database is available as ``applied_on``.
+        timeout: The number of seconds to wait for the applied migrations
+            of ``databases``.
 
     Returns:
         The rendered migration list.
     """
-    migrations = Migrations()
+    migrations = Migrations(applied_from=applied_from, databases=databases, timeout=timeout)
 
     if app_labels:
         migrations = migrations.intersect("app_label", app_labels)
@@ -487,20 +2262,26 @@ def show(
     if unapplied:
         migrations = migrations.filter("applied", False)
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(_get_migration_docs_file_root()),
-        trim_blocks=True,
-    )
+    env = _get_show_environment(_get_migration_docs_file_root(), _get_migration_docs_cache_root())
     template_file = "show.tpl" if style == "default" else f"show_{style}.tpl"
-    try:
-        template = env.get_template(template_file)
-    except jinja2.exceptions.TemplateNotFound:
-        if style == "default":
-            # Use the default migration template if the user didn't provide one
-            template = jinja2.Template(DEFAULT_MIGRATION_TEMPLATE, trim_blocks=True)
-        else:
-            raise
+    template = env.get_template(template_file)
+
+    context = {"migrations": migrations, "app_labels": app_labels, "unapplied": unapplied}
+    if stream:
+        return _render_chunks(template, context)
+    else:
+        with profiling.phase("render"):
+            return template.render(**context)
+
+
+def _render_chunks(template, context):
+    """Render a template in chunks, profiling the rendering of every chunk"""
+    chunks = template.generate(**context)
+    while True:
+        with profiling.phase("render"):
+            chunk = next(chunks, None)
 
-    rendered = template.render(migrations=migrations, app_labels=app_labels, unapplied=unapplied)
+        if chunk is None:
+            return
 
-    return rendered
+        yield chunk
@@ -0,0 +1,179 @@
+"""A daemon that runs check and show for `migration_docs.client`
+
+Setting up Django and importing migrations take most of the time of
+``check`` and ``show`` in large projects. The daemon does both once and
+runs the subcommands of clients in the same process.
+"""
+
+import contextlib
+import importlib
+import io
+import os
+import socket
+import sys
+import time
+from typing import Callable, Union
+
+from django.core.management import call_command
+from django.db import connections
+
+from migration_docs import client, core
+
+# The number of seconds to wait for the request of a client. Clients are
+# served one at a time, so a client that connects without sending a request
+# must not block the others for long
+REQUEST_TIMEOUT = 5
+
+
+def _get_socket_path():
+    """
+    The default socket path. Configurable with the MIGRATION_DOCS_SOCKET
+    env var
+    """
+    return os.environ.get("MIGRATION_DOCS_SOCKET") or core._get_migration_docs_cache_path(
+        "daemon.sock"
+    )
+
+
+def _is_listening(path):
+    """True if a daemon is listening on a socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(path)
+        except OSError:
+            return False
+
+    return True
+
+
+def _unload_changed_migrations(watched, current):
+    """
+    Remove the modules of changed migration files from ``sys.modules`` so
+    that Django imports them again when loading migrations.
+    """
+    changed = {
+        os.path.realpath(path)
+        for path in watched.keys() | current.keys()
+        if watched.get(path) != current.get(path)
+    }
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.realpath(path) in changed:
+            del sys.modules[name]
+
+    # New files are not found by imports until finders forget what they listed
+    importlib.invalidate_caches()
+
+
+def _run(argv):
+    """
+    Run a migration_docs subcommand and capture its output.
+
+    Returns:
+        dict: The exit code, stdout, and stderr of the subcommand.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            call_command("migration_docs", *argv, stdout=stdout, stderr=stderr)
+        except SystemExit as exc:
+            exit_code = exc.code or 0
+        except Exception as exc:
+            stderr.write(f"{exc}\n")
+            exit_code = 1
+
+    return {"exit_code": exit_code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+def _error(message):
+    """The response to a request that cannot be run"""
+    return {"exit_code": 2, "stdout": "", "stderr": f"django-migration-docs: {message}\n"}
+
+
+def serve(
+    socket_path: Union[str, None] = None,
+    idle_timeout: Union[float, None] = 1800,
+    msg: Callable = core._pretty_msg,
+) -> None:
+    """
+    Run ``check`` and ``show`` for clients connecting to a Unix socket.
+
+    Clients are served one at a time. Clients that don't send a request
+    within a few seconds are disconnected. Before every request, the
+    modification times of migration files and docs are compared with those
+    of the previous request. Changed migration modules are unloaded so that
+    the next request imports them again. Docs are read on every request.
+    Changes to settings and models need a restart of the daemon.
+
+    Args:
+        socket_path: The path of the socket. Defaults to
+            ``daemon.sock`` in the cache directory.
+        idle_timeout: Stop after this many seconds without requests. Serves
+            until interrupted if None or 0.
+        msg: A message printer for showing messages to the user.
+    """
+    path = socket_path or _get_socket_path()
+    if os.path.exists(path):
+        if _is_listening(path):
+            raise RuntimeError(f"django-migration-docs: A daemon is already listening on {path}.")
+
+        os.remove(path)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    migration_dirs = core._get_migration_dirs()
+    watched = core._get_watched_files(migration_dirs)
+    cwd = os.path.realpath(os.getcwd())
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Bind to a relative path since socket paths are limited to about
+        # 100 characters
+        server.bind(os.path.relpath(path))
+        server.listen()
+        server.settimeout(idle_timeout or None)
+        msg(f"django-migration-docs: Serving check and show on {path}.")
+
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                msg(
+                    f"django-migration-docs: Stopped after {idle_timeout:g} second(s)"
+                    " without requests.",
+                    fg="yellow",
+                )
+                return
+
+            # Clients that disconnect or send invalid requests get no response
+            with contextlib.suppress(OSError, ValueError), conn, conn.makefile("rwb") as f:
+                conn.settimeout(REQUEST_TIMEOUT)
+                request = client.receive(f)
+                if not isinstance(request, dict):
+                    continue
+
+                argv = request.get("argv")
+                if not argv or argv[0] not in client.COMMANDS:
+                    response = _error(f"The daemon only runs {' and '.join(client.COMMANDS)}.")
+                elif os.path.realpath(request.get("cwd", "")) != cwd:
+                    response = _error(f"The daemon serves {cwd}. Run the client from there.")
+                else:
+                    start = time.perf_counter()
+                    current = core._get_watched_files(migration_dirs)
+                    if current != watched:
+                        _unload_changed_migrations(watched, current)
+                        watched = current
+
+                    response = _run(argv)
+                    connections.close_all()
+                    msg(
+                        f'django-migration-docs: Ran "{" ".join(argv)}" in'
+                        f" {(time.perf_counter() - start) * 1000:.0f}ms.",
+                        fg="yellow",
+                    )
+
+                client.send(f, response)
+    finally:
+        server.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
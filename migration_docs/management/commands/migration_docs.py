@@ -1,8 +1,10 @@
+import argparse
 import sys
 
 from django.core.management.base import BaseCommand
 
 import migration_docs
+from migration_docs import daemon, profiling
 
 
 class SubCommands(BaseCommand):
@@ -16,6 +18,18 @@ class SubCommands(BaseCommand):
     subcommands = {}
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help=(
+                "Print the time and peak memory of every phase of the subcommand"
+                " (e.g. loading migrations, hashing, rendering) to stderr."
+            ),
+        )
+        parser.add_argument(
+            "--profile-output",
+            help="Profile the subcommand with cProfile and save the stats to this path.",
+        )
         subparsers = parser.add_subparsers(dest="subcommand", title="subcommands", description="")
         subparsers.required = True
 
@@ -41,8 +55,21 @@ class SubCommands(BaseCommand):
         self.subcommands.get(command_name)
         command_class = self.subcommands[command_name]
 
+        if not options["profile"] and not options["profile_output"]:
+            return self.run_subcommand(command_class, *args, **options)
+
+        profiler = profiling.Profiler(pstats_path=options["profile_output"])
+        try:
+            with profiler:
+                return self.run_subcommand(command_class, *args, **options)
+        finally:
+            self.stderr.write(profiler.report(), ending="")
+
+    def run_subcommand(self, command_class, *args, **options):
         if self.argv:
-            args = [self.argv[0]] + self.argv[2:]
+            # Skip the arguments of this command that come before the subcommand
+            index = self.argv.index(options["subcommand"], 2)
+            args = [self.argv[0]] + self.argv[index:]
             return command_class().run_from_argv(args)
         else:
             return command_class().execute(*args, **options)
@@ -55,18 +82,88 @@ class BootstrapCommand(BaseCommand):
         migration_docs.bootstrap()
 
 
+def _add_verify_hashes_argument(parser):
+    parser.add_argument(
+        "--verify-hashes",
+        action="store_true",
+        help=(
+            "Hash every migration file instead of using hashes cached in"
+            " .migration-docs/cache for unchanged files."
+        ),
+    )
+
+
+def _positive_int(value):
+    """Parse a positive integer argument"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'"{value}" is not a positive integer.')
+
+    return number
+
+
+def _add_jobs_argument(parser):
+    parser.add_argument(
+        "--jobs",
+        type=_positive_int,
+        default=None,
+        help=(
+            "The number of threads used to hash migration files. Defaults to"
+            " a number based on the CPU count."
+        ),
+    )
+
+
 class SyncCommand(BaseCommand):
     help = "Adds, updates, and removes migration docs for a project."
 
+    def add_arguments(self, parser):
+        _add_verify_hashes_argument(parser)
+        _add_jobs_argument(parser)
+
     def handle(self, *args, **options):
-        migration_docs.sync()
+        migration_docs.sync(verify_hashes=options["verify_hashes"], jobs=options["jobs"])
 
 
 class CheckCommand(BaseCommand):
     help = "Checks that the migration docs are in sync."
 
+    def add_arguments(self, parser):
+        _add_verify_hashes_argument(parser)
+        _add_jobs_argument(parser)
+        parser.add_argument(
+            "--fast",
+            action="store_true",
+            help=(
+                "Find migration files on disk without importing migrations or"
+                " connecting to the database."
+            ),
+        )
+        parser.add_argument(
+            "--since",
+            help=(
+                "Only check migration files that changed since this git ref (e.g."
+                ' "origin/main"), including uncommitted files. Implies --fast.'
+            ),
+        )
+        parser.add_argument(
+            "--files",
+            nargs="+",
+            help="Only check these migration files. Other files are ignored. Implies --fast.",
+        )
+
     def handle(self, *args, **options):
-        if not migration_docs.check():
+        if not migration_docs.check(
+            verify_hashes=options["verify_hashes"],
+            fast=options["fast"],
+            jobs=options["jobs"],
+            since=options["since"],
+            files=options["files"],
+        ):
             sys.exit(1)
         else:
             sys.exit(0)
@@ -95,14 +192,65 @@ class ShowCommand(BaseCommand):
             action="store_true",
             help="Only show unapplied migrations.",
         )
+        parser.add_argument(
+            "--applied-from",
+            help=(
+                'Read applied migrations from a file created with "migration_docs'
+                ' snapshot" instead of querying the database.'
+            ),
+        )
+        parser.add_argument(
+            "--database",
+            action="append",
+            dest="databases",
+            help=(
+                'Also read applied migrations of a database, or "all" databases.'
+                " Can be used multiple times. Databases are queried concurrently"
+                " and their applied status is available as"
+                " migration.applied_on in templates."
+            ),
+        )
+        parser.add_argument(
+            "--database-timeout",
+            type=float,
+            default=30,
+            help=(
+                "The number of seconds to wait for the applied migrations of"
+                " databases given with --database. Defaults to 30."
+            ),
+        )
 
     def handle(self, *args, **options):
-        rendered = migration_docs.show(
+        # Write the docs as they are rendered so that large outputs can be
+        # piped without being held in memory
+        for chunk in migration_docs.show(
             app_labels=options["app_label"],
             unapplied=options["unapplied"],
             style=options["style"],
+            stream=True,
+            applied_from=options["applied_from"],
+            databases="all" if "all" in (options["databases"] or []) else options["databases"],
+            timeout=options["database_timeout"],
+        ):
+            sys.stdout.write(chunk)
+
+
+class SnapshotCommand(BaseCommand):
+    help = "Saves the applied migrations of a database to a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            help='The path of the snapshot file, which can be used with "show --applied-from".',
+        )
+        parser.add_argument(
+            "--database",
+            default="default",
+            help='The database to read applied migrations from. Defaults to "default".',
         )
-        print(rendered, end="")
+
+    def handle(self, *args, **options):
+        migration_docs.snapshot(options["path"], using=options["database"])
 
 
 class UpdateCommand(BaseCommand):
@@ -119,19 +267,101 @@ class UpdateCommand(BaseCommand):
         migration_docs.update(options["migration"])
 
 
+class ConvertCommand(BaseCommand):
+    help = "Converts migration docs between the single-file and sharded layouts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "layout",
+            choices=["single", "sharded"],
+            help=(
+                'The layout to convert to. "single" stores docs in'
+                ' .migration-docs/docs.yaml. "sharded" stores docs in one'
+                " .migration-docs/docs/{app_label}.yaml file per app."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        migration_docs.convert(options["layout"])
+
+
+class WatchCommand(BaseCommand):
+    help = "Checks migration docs every time migration files or docs change."
+
+    def add_arguments(self, parser):
+        _add_jobs_argument(parser)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="The number of seconds between checking files for changes. Defaults to 1.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            migration_docs.watch(interval=options["interval"], jobs=options["jobs"])
+        except KeyboardInterrupt:
+            pass
+
+
+class ServeCommand(BaseCommand):
+    help = "Runs a daemon that serves check and show to migration_docs.client."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            help=(
+                "The path of the Unix socket. Defaults to the MIGRATION_DOCS_SOCKET"
+                " environment variable or .migration-docs/cache/daemon.sock."
+            ),
+        )
+        parser.add_argument(
+            "--idle-timeout",
+            type=float,
+            default=1800,
+            help=(
+                "Stop after this many seconds without requests. Defaults to 1800."
+                " Use 0 to serve until interrupted."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            daemon.serve(socket_path=options["socket"], idle_timeout=options["idle_timeout"])
+        except KeyboardInterrupt:
+            pass
+
+
+class GcCommand(BaseCommand):
+    help = "Removes SQL blobs in .migration-docs/sql that no docs reference."
+
+    def handle(self, *args, **options):
+        migration_docs.gc()
+
+
 class Command(SubCommands):
     help = """
      migration_docs must be followed by a subcommand to:\n
      - 'bootstrap' the project with initial migration docs\n
      - 'check' the status of the migration docs\n
+     - 'watch' migrations and check docs when they change\n
+     - 'serve' check and show to clients from a daemon\n
      - 'sync' the docs\n
      - 'show' the migration docs.\n
-     - 'update' docs for individual migrations.
+     - 'update' docs for individual migrations.\n
+     - 'convert' docs between the single-file and sharded layouts.\n
+     - 'snapshot' the applied migrations of a database.\n
+     - 'gc' unreferenced SQL blobs.
     """
     subcommands = {
         "bootstrap": BootstrapCommand,
         "sync": SyncCommand,
         "check": CheckCommand,
+        "watch": WatchCommand,
+        "serve": ServeCommand,
         "show": ShowCommand,
         "update": UpdateCommand,
+        "convert": ConvertCommand,
+        "snapshot": SnapshotCommand,
+        "gc": GcCommand,
     }
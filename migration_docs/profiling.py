@@ -0,0 +1,265 @@
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# The profiler collecting phases, if any
+_profiler = None
+
+# The tracer collecting spans, if any
+_tracer = None
+
+_no_phase = contextlib.nullcontext()
+
+
+def phase(name, **args):
+    """Record the time and memory spent in a phase when profiling or tracing
+
+    Keyword arguments are attached to the span of the phase when tracing.
+    """
+    if _profiler is None and _tracer is None:
+        return _no_phase
+    else:
+        return _phase(name, args)
+
+
+@contextlib.contextmanager
+def _phase(name, args):
+    profiler = _profiler
+    tracer = _tracer
+    with profiler.phase(name) if profiler else _no_phase:
+        with tracer.span(name, args) if tracer else _no_phase:
+            yield
+
+
+def phased(name):
+    """Record every call of the decorated function as a phase"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def span(name, **args):
+    """Record a span when tracing. Unlike a phase, spans are not profiled
+
+    Use spans for fine-grained work, such as the work done for every
+    migration, that would clutter the profile.
+    """
+    if _tracer is None:
+        return _no_phase
+    else:
+        return _tracer.span(name, args)
+
+
+def start_tracing(path):
+    """Trace phases and spans until `stop_tracing` is called or the process exits
+
+    Args:
+        path (str): The path of the trace file. ``{pid}`` is replaced with
+            the ID of the process.
+    """
+    global _tracer
+
+    if _tracer is None:
+        _tracer = Tracer(path.format(pid=os.getpid()))
+        atexit.register(stop_tracing)
+
+
+def stop_tracing():
+    """Stop tracing and save the trace file"""
+    global _tracer
+
+    tracer, _tracer = _tracer, None
+    if tracer:
+        atexit.unregister(stop_tracing)
+        tracer.save()
+
+
+def _format_bytes(num_bytes):
+    """Format a number of bytes for humans"""
+    for unit in ["B", "KiB", "MiB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+
+        num_bytes /= 1024
+
+    return f"{num_bytes:.1f} GiB"
+
+
+class Profiler:
+    def __init__(self, pstats_path=None):
+        """
+        Profiles the phases of migration_docs operations.
+
+        Phases are instrumented with `phase` in the core module. While
+        the profiler is active, it records the wall time and the peak memory
+        allocated by Python during every phase. Phases can be nested, in
+        which case the time and memory of the inner phase also count towards
+        the outer phase.
+
+        Args:
+            pstats_path (str, default=None): Also run cProfile and dump its
+                stats to this path.
+        """
+        self._pstats_path = pstats_path
+        self._cprofile = None
+        self._stack = []
+        self._started_tracemalloc = False
+        self.phases = {}
+        self.total_seconds = 0
+
+    def __enter__(self):
+        global _profiler
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        if self._pstats_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+        self._start = time.perf_counter()
+        _profiler = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _profiler
+
+        _profiler = None
+        self.total_seconds = time.perf_counter() - self._start
+
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self._pstats_path)
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the time and memory spent in a phase"""
+        if any(frame["name"] == name for frame in self._stack):
+            # Only the outermost of nested phases with the same name counts
+            yield
+            return
+
+        # Resetting the peak memory loses the peak of enclosing phases, so
+        # carry it over to them first
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame["peak"] = max(frame["peak"], peak - frame["start_memory"])
+
+        tracemalloc.reset_peak()
+        frame = {"name": name, "start_memory": current, "peak": 0}
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            frame["peak"] = max(frame["peak"], peak - frame["start_memory"])
+            self._stack.pop()
+            for parent in self._stack:
+                parent["peak"] = max(
+                    parent["peak"], frame["peak"] + frame["start_memory"] - parent["start_memory"]
+                )
+
+            stats = self.phases.setdefault(name, {"calls": 0, "seconds": 0, "peak_memory": 0})
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["peak_memory"] = max(stats["peak_memory"], frame["peak"])
+
+    def report(self):
+        """A table of the time and peak memory of every phase"""
+        rows = [("Phase", "Calls", "Time", "Peak memory")]
+        rows += [
+            (
+                name,
+                str(stats["calls"]),
+                f"{stats['seconds']:.3f}s",
+                _format_bytes(stats["peak_memory"]),
+            )
+            for name, stats in sorted(
+                self.phases.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )
+        ]
+        rows.append(("total", "", f"{self.total_seconds:.3f}s", ""))
+        widths = [max(len(row[column]) for row in rows) for column in range(4)]
+
+        lines = [
+            "  ".join(
+                [
+                    row[0].ljust(widths[0]),
+                    *(value.rjust(width) for value, width in zip(row[1:], widths[1:])),
+                ]
+            ).rstrip()
+            for row in rows
+        ]
+        if self._pstats_path:
+            lines.append(f"cProfile stats saved to {self._pstats_path}")
+
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    def __init__(self, path):
+        """
+        Traces spans of migration_docs operations in the Chrome trace event
+        format, which can be viewed with Perfetto (https://ui.perfetto.dev)
+        or chrome://tracing.
+
+        Args:
+            path (str): The path of the trace file.
+        """
+        self.path = path
+        self.events = []
+        self._start = time.perf_counter_ns()
+
+    @contextlib.contextmanager
+    def span(self, name, args=None):
+        """Record a span as a complete event"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                "name": name,
+                "cat": "migration_docs",
+                "ph": "X",
+                "ts": (start - self._start) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {key: str(value) for key, value in args.items()}
+
+            self.events.append(event)
+
+    def save(self):
+        """Save the trace file"""
+        metadata = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "args": {"name": "migration_docs"},
+            }
+        ]
+        with open(self.path, "w+") as f:
+            json.dump({"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}, f)
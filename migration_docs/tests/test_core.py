@@ -1,11 +1,27 @@
 """Unit tests for the core migration_docs module"""
 
+import ast
+import collections
+import datetime
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import subprocess
+import sys
+import threading
+import time
 from contextlib import ExitStack as does_not_raise
 
 import django
+import jinja2
 import pytest
+import yaml
 from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.graph import MigrationGraph
 from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.migration import Migration as DjangoMigration
 
 from migration_docs import core
 
@@ -76,6 +92,30 @@ def test_migration_properties(migration_name, attribute, expected_exception, exp
         assert getattr(migration, attribute) == expected_value
 
 
+@pytest.mark.django_db
+def test_migration_doc_attributes(mocker, tmp_path):
+    """Verifies documented and schema attributes are looked up on a miss"""
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        autospec=True,
+        return_value=str(tmp_path),
+    )
+    migrations = core.Migrations()
+    migration = migrations["tests.0001_initial"]
+    assert not hasattr(migration, "__dict__")
+
+    assert migration.description is None
+    migrations._docs["tests.0001_initial"] = {"description": "Docs", "sql": "Stale"}
+    assert migration.description == "Docs"
+    assert migration.sql != "Stale"
+    with pytest.raises(AttributeError, match="invalid"):
+        assert migration.invalid
+
+    # Internal attributes never fall back to the docs
+    with pytest.raises(AttributeError, match="_docs"):
+        assert core.Migration.__new__(core.Migration).label
+
+
 @pytest.mark.django_db
 def test_bad_migration_sql_collection(mocker):
     if (django.VERSION[0] >= 3 and django.VERSION[1] >= 1) or django.VERSION[0] >= 4:
@@ -92,11 +132,138 @@ def test_bad_migration_sql_collection(mocker):
 
     migrations = core.Migrations()
 
+    assert len(migrations) == 3
+    for migration in migrations:
+        # Migrations outside of a plan collect their SQL in isolation
+        isolated = core.Migration(
+            migration._node,
+            executor=migrations._executor,
+            loader=migrations._loader,
+            docs=migrations._docs,
+        )
+        assert isolated.sql == 'Error obtaining SQL - "Cannot collect."'
+
+
+@pytest.mark.django_db
+def test_bad_migration_sql_collection_in_plan(mocker):
+    """Errors are reported per migration when collecting SQL for a plan"""
+    mocker.patch.object(
+        DjangoMigration,
+        "apply",
+        autospec=True,
+        side_effect=RuntimeError("Cannot collect."),
+    )
+
+    migrations = core.Migrations()
+
     assert len(migrations) == 3
     for migration in migrations:
         assert migration.sql == 'Error obtaining SQL - "Cannot collect."'
 
 
+@pytest.mark.django_db
+def test_bad_migration_state_in_plan(mocker):
+    """
+    When the project state cannot be carried past a migration, the remaining
+    migrations fall back to collecting their SQL in isolation
+    """
+    mocker.patch.object(
+        DjangoMigration,
+        "mutate_state",
+        autospec=True,
+        side_effect=RuntimeError("Bad state."),
+    )
+
+    migrations = core.Migrations()
+    migrations.collect_sql([migrations["tests.0002_testmodel_field2"]])
+    assert migrations["tests.0001_initial"]._cached_sql is None
+    assert migrations["tests.0002_testmodel_field2"].sql == 'Error obtaining SQL - "Bad state."'
+
+    mocker.patch.object(
+        DjangoMigration,
+        "apply",
+        autospec=True,
+        side_effect=RuntimeError("Cannot collect."),
+    )
+    migrations = core.Migrations()
+    assert migrations["tests.0001_initial"].sql == 'Error obtaining SQL - "Cannot collect."'
+    assert migrations["tests.0003_testmodel_field3"].sql == 'Error obtaining SQL - "Bad state."'
+
+
+@pytest.mark.django_db
+def test_collect_sql_single_pass():
+    """
+    SQL collected in a single pass matches the SQL Django collects when
+    carrying the state across the whole plan
+    """
+    migrations = core.Migrations()
+    migrations.collect_sql([migrations["tests.0003_testmodel_field3"]])
+    assert migrations["tests.0001_initial"]._cached_sql is None
+    assert migrations["tests.0003_testmodel_field3"]._cached_sql is not None
+
+    migrations = core.Migrations()
+    expected_sql = migrations._loader.collect_sql(
+        [(migration._node, False) for migration in migrations]
+    )
+    assert "\n".join(migration.sql for migration in migrations) == "\n".join(expected_sql)
+
+
+@pytest.mark.django_db
+def test_migration_sql_only_renders_accessed(mocker, settings, tmp_path):
+    """
+    Accessing the SQL of a migration only renders its SQL. Later migrations
+    continue from the state where the plan stopped
+    """
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    apply = mocker.spy(DjangoMigration, "apply")
+    mutate_state = mocker.spy(DjangoMigration, "mutate_state")
+
+    migrations = core.Migrations()
+    assert migrations["tests.0001_initial"].sql
+    assert [call.args[0].name for call in apply.call_args_list] == ["0001_initial"]
+    assert migrations["tests.0002_testmodel_field2"]._cached_sql is None
+
+    # Filtered lists share the progress of the plan
+    assert migrations.filter("label", "tests.0003_testmodel_field3")[0].sql
+    assert [call.args[0].name for call in apply.call_args_list] == [
+        "0001_initial",
+        "0003_testmodel_field3",
+    ]
+    assert [call.args[0].name for call in mutate_state.call_args_list] == ["0002_testmodel_field2"]
+    assert migrations["tests.0002_testmodel_field2"]._cached_sql is None
+
+    # Earlier migrations are rendered from the start of the plan
+    migration = migrations["tests.0002_testmodel_field2"]
+    assert migration.sql == migration._collect_sql()
+
+
+def test_get_forwards_plan():
+    """
+    The plan matches concatenating the forwards plan of every leaf node
+    and removing duplicates
+    """
+    graph = MigrationGraph()
+    for app in ["auth", "blog", "shop", "users"]:
+        for number in range(1, 4):
+            graph.add_node((app, f"000{number}"), None)
+            if number > 1:
+                graph.add_dependency(None, (app, f"000{number}"), (app, f"000{number - 1}"))
+
+    graph.add_dependency(None, ("blog", "0001"), ("users", "0002"))
+    graph.add_dependency(None, ("shop", "0002"), ("blog", "0003"))
+    graph.add_dependency(None, ("shop", "0003"), ("auth", "0001"))
+    graph.add_dependency(None, ("users", "0001"), ("auth", "0003"))
+
+    expected_plan = []
+    for target in graph.leaf_nodes():
+        for key in graph.forwards_plan(target):
+            if key not in expected_plan:
+                expected_plan.append(key)
+
+    assert core._get_forwards_plan(graph) == expected_plan
+    assert core._get_forwards_plan(MigrationGraph()) == []
+
+
 def test_migration_docs_no_files():
     """
     Verify the MigrationDocs object loads no docs when the
@@ -153,3 +320,827 @@ def test_migration_schema_invalid_yaml(mocker, tmp_path):
 
     with pytest.raises(RuntimeError, match="migration.yaml is corrupt"):
         core.MigrationDocs().schema  # noqa
+
+
+@pytest.mark.django_db
+def test_migration_hash_cache(mocker, settings, tmp_path):
+    """Migration files are only hashed again when their stat metadata changes"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path / "cache")
+    mocker.patch("time.time_ns", return_value=time.time_ns() + 10_000_000_000)
+    read_source = mocker.patch(
+        "migration_docs.core._read_source", autospec=True, side_effect=core._read_source
+    )
+
+    migrations = core.Migrations()
+    for migration in migrations:
+        assert migration.hash == core._hash_source(
+            inspect.getsource(inspect.getmodule(migration._node))
+        )
+    migrations._hash_cache.save()
+    assert read_source.call_count == 3
+    assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+    cache = json.loads((tmp_path / "cache" / "hashes.json").read_text())
+    assert cache["version"] == core.MigrationHashCache.version
+    assert sorted(entry[3]["source"] for entry in cache["hashes"].values()) == [
+        "4fc52e2588468f2922700a07cedb05fb",
+        "85d60942ace5acbdd2744d5ba88cbc4a",
+        "da668fdffa3bb9435bf9773b0637fc8a",
+    ]
+
+    # Cached hashes are used for unchanged files
+    migrations = core.Migrations()
+    assert migrations["tests.0001_initial"].hash == "4fc52e2588468f2922700a07cedb05fb"
+    assert read_source.call_count == 3
+
+    # Files are hashed again when their stat metadata changes
+    path = next(iter(cache["hashes"]))
+    cache["hashes"][path][0] -= 1
+    (tmp_path / "cache" / "hashes.json").write_text(json.dumps(cache))
+    migrations = core.Migrations()
+    [migration.hash for migration in migrations]
+    assert read_source.call_count == 4
+
+    # Verifying hashes ignores the cache
+    migrations = core.Migrations(verify_hashes=True)
+    [migration.hash for migration in migrations]
+    assert read_source.call_count == 7
+
+
+def test_hash_source_ast(settings):
+    """AST fingerprints ignore formatting, comments, docstrings, and import order"""
+    source = (
+        "from django.db import migrations, models\n"
+        "import uuid\n"
+        "\n"
+        "\n"
+        "class Migration(migrations.Migration):\n"
+        "    dependencies = [('tests', '0001_initial')]\n"
+        "    operations = [migrations.DeleteModel(name='TestModel')]\n"
+    )
+    reformatted = (
+        '"""Deletes the test model"""\n'
+        "import uuid\n"
+        "\n"
+        "from django.db import models, migrations\n"
+        "\n"
+        "\n"
+        "class Migration(migrations.Migration):\n"
+        '    """A migration"""\n'
+        "\n"
+        '    dependencies = [("tests", "0001_initial")]  # The first migration\n'
+        "    operations = [\n"
+        '        migrations.DeleteModel(name="TestModel"),\n'
+        "    ]\n"
+    )
+    changed = source.replace("0001_initial", "0002_testmodel_field2")
+
+    assert core._hash_source(source) != core._hash_source(reformatted)
+    assert core._hash_source(source, kind="ast") == core._hash_source(reformatted, kind="ast")
+    assert core._hash_source(source, kind="ast") != core._hash_source(changed, kind="ast")
+    assert core._hash_source(source, kind="ast").startswith("ast:")
+    assert core._get_hash_kind(core._hash_source(source, kind="ast")) == "ast"
+    assert core._get_hash_kind(core._hash_source(source)) == "source"
+
+    # Source that cannot be parsed falls back to the source fingerprint
+    assert core._hash_source("invalid(", kind="ast") == core._hash_source("invalid(")
+
+    # The fingerprint is the same on every Python version, unlike ast.dump
+    with open(os.path.join(os.path.dirname(__file__), "migrations", "0001_initial.py")) as f:
+        assert core._hash_source(f.read(), kind="ast") == "ast:6def96c3174bad0ae62bd8692492d6b1"
+    assert core._dump_ast(ast.parse("def f(): pass")) == (
+        "Module(body=[FunctionDef(name='f', args=arguments(), body=[Pass()])])"
+    )
+
+    settings.MIGRATION_DOCS_FINGERPRINT = "invalid"
+    with pytest.raises(RuntimeError, match="Invalid MIGRATION_DOCS_FINGERPRINT"):
+        core._get_fingerprint_kind()
+
+
+@pytest.mark.django_db
+def test_migration_fingerprints(mocker, settings, tmp_path):
+    """Docs are compared against the kind of fingerprint stored in them"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path / "cache")
+    mocker.patch("time.time_ns", return_value=time.time_ns() + 10_000_000_000)
+    migrations = core.Migrations()
+    source_hashes = {migration.label: migration.hash for migration in migrations}
+    migrations._hash_cache.save()
+
+    settings.MIGRATION_DOCS_FINGERPRINT = "ast"
+    docs = {
+        "tests.0001_initial": {"_hash": source_hashes["tests.0001_initial"]},
+        "tests.0002_testmodel_field2": {"_hash": "stale"},
+        "tests.0003_testmodel_field3": {"_hash": "ast:stale"},
+    }
+    (tmp_path / "docs.yaml").write_text(yaml.dump(docs))
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+
+    migrations = core.Migrations()
+    assert all(migration.hash.startswith("ast:") for migration in migrations)
+    assert [migration.label for migration in migrations.filter_by_stale_docs()] == [
+        "tests.0002_testmodel_field2",
+        "tests.0003_testmodel_field3",
+    ]
+    assert [migration.label for migration in migrations.filter_by_other_fingerprints()] == [
+        "tests.0001_initial",
+        "tests.0002_testmodel_field2",
+    ]
+    assert core.MigrationFiles().filter_by_stale_docs() == [
+        "tests.0002_testmodel_field2",
+        "tests.0003_testmodel_field3",
+    ]
+
+    # Both kinds of fingerprints are cached
+    migrations._hash_cache.save()
+    cache = json.loads((tmp_path / "cache" / "hashes.json").read_text())
+    assert all(set(entry[3]) == {"source", "ast"} for entry in cache["hashes"].values())
+
+
+@pytest.mark.django_db
+def test_sql_cache(mocker, settings, tmp_path):
+    """SQL is reused across runs when the migrations up to a migration are unchanged"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    settings.MIGRATION_DOCS_SQL_CACHE_SIZE = 10
+
+    migrations = core.Migrations()
+    migrations.collect_sql()
+    expected_sql = [migration.sql for migration in migrations]
+    keys = migrations._get_sql_cache_keys()
+    assert len(set(keys.values())) == 3
+    assert len(os.listdir(tmp_path / "sql")) == 3
+
+    # Cached SQL is used instead of rendering it again
+    mocker.patch.object(
+        DjangoMigration, "apply", autospec=True, side_effect=RuntimeError("Cannot collect.")
+    )
+    migrations = core.Migrations()
+    assert [migration.sql for migration in migrations] == expected_sql
+
+    # Keys change with the hashes of earlier migrations in the plan
+    migrations = core.Migrations()
+    migrations["tests.0002_testmodel_field2"]._cached_hash = "changed"
+    changed_keys = migrations._get_sql_cache_keys()
+    assert changed_keys["tests.0001_initial"] == keys["tests.0001_initial"]
+    assert changed_keys["tests.0002_testmodel_field2"] != keys["tests.0002_testmodel_field2"]
+    assert changed_keys["tests.0003_testmodel_field3"] != keys["tests.0003_testmodel_field3"]
+
+    # Earlier migrations that aren't ancestors also change the state SQL is rendered against
+    migrations = core.Migrations()
+    other = mocker.Mock(label="other.0001_initial", _cached_hash="other", hash="other")
+    migrations._forwards_plan.insert(0, other)
+    assert set(migrations._get_sql_cache_keys().values()).isdisjoint(keys.values())
+
+    # Only the migrations up to the requested ones are hashed
+    migrations = core.Migrations()
+    assert migrations._get_sql_cache_keys(["tests.0001_initial"]) == {
+        "tests.0001_initial": keys["tests.0001_initial"]
+    }
+    assert migrations["tests.0002_testmodel_field2"]._cached_hash is None
+
+    # Keys change with the Django version and settings that affect SQL
+    settings.AUTH_USER_MODEL = "tests.User"
+    assert set(core.Migrations()._get_sql_cache_keys().values()).isdisjoint(keys.values())
+    del settings.AUTH_USER_MODEL
+
+    mocker.patch("django.get_version", autospec=True, return_value="0.0")
+    assert set(core.Migrations()._get_sql_cache_keys().values()).isdisjoint(keys.values())
+
+    # Nothing is cached when the cache is disabled
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path / "disabled")
+    settings.MIGRATION_DOCS_SQL_CACHE_SIZE = 0
+    core.Migrations().collect_sql()
+    assert not (tmp_path / "disabled" / "sql").exists()
+
+
+@pytest.mark.django_db
+def test_unwritable_cache(mocker, settings, tmp_path):
+    """Commands that only read docs work when the cache directory can't be written"""
+    migration_docs_root = tmp_path / ".migration-docs"
+    migration_docs_root.mkdir()
+    (migration_docs_root / "docs.yaml").write_text("tests.0001_initial:\n  _hash: stale\n")
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(migration_docs_root),
+        autospec=True,
+    )
+    (tmp_path / "file").write_text("")
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path / "file" / "cache")
+    settings.MIGRATION_DOCS_SQL_CACHE_SIZE = 10
+
+    assert not core.check(msg=core._no_msg, fast=True)
+    assert not core.check(msg=core._no_msg)
+    assert "tests.0001_initial" in core.show()
+
+    sql_cache = core.MigrationSQLCache()
+    sql_cache.set("key", "SQL")
+    sql_cache.save()
+    assert sql_cache.get("key") is None
+
+    # Templates are still compiled when their bytecode can't be written
+    bytecode_cache = core._BytecodeCache(str(tmp_path / "missing"))
+    bucket = jinja2.bccache.Bucket(jinja2.Environment(), "key", "checksum")
+    bucket.code = compile("", "<template>", "exec")
+    bytecode_cache.dump_bytecode(bucket)
+
+
+def test_sql_cache_eviction(settings, tmp_path):
+    """The least recently used SQL is evicted when the cache is full"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    cache = core.MigrationSQLCache(max_entries=2)
+    for mtime, key in enumerate(["a", "b", "c"], 1):
+        cache.set(key, f"SQL {key}")
+        os.utime(cache._get_path(key), ns=(mtime, mtime))
+
+    assert cache.get("a") == "SQL a"
+    assert cache.get("missing") is None
+    cache.save()
+    assert cache.get("b") is None
+    assert cache.get("a") == "SQL a"
+    assert cache.get("c") == "SQL c"
+
+    # The cache is only pruned after SQL is added
+    os.utime(cache._get_path("a"), ns=(1, 1))
+    core.MigrationSQLCache(max_entries=1).save()
+    assert cache.get("a") == "SQL a"
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_sql_blobs(mocker, settings, tmp_path, compress):
+    """SQL is stored in content-addressed blobs that are optionally compressed"""
+    settings.MIGRATION_DOCS_SQL_STORE = "blobs"
+    settings.MIGRATION_DOCS_SQL_COMPRESS = compress
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+
+    digest = core._write_sql_blob("CREATE TABLE")
+    assert digest == hashlib.sha256(b"CREATE TABLE").hexdigest()
+    assert core._write_sql_blob("CREATE TABLE") == digest
+    assert os.listdir(tmp_path / "sql") == [f"{digest}.sql.gz" if compress else f"{digest}.sql"]
+    assert core._read_sql_blob(digest) == "CREATE TABLE"
+    assert core._read_sql_blob("missing") is None
+
+    docs = core._store_sql({"sql": "inline", "type": "before"}, "CREATE TABLE")
+    assert docs == {"_sql": digest, "type": "before"}
+    assert core._get_docs_sql_store(docs) == "blobs"
+    assert core._load_sql(docs) == "CREATE TABLE"
+
+    assert core._prune_sql_blobs({"tests.0001_initial": docs, "tests.0002": None}) == 0
+    assert core._prune_sql_blobs({}) == 1
+    assert not os.listdir(tmp_path / "sql")
+
+    settings.MIGRATION_DOCS_SQL_STORE = "invalid"
+    with pytest.raises(RuntimeError, match="Invalid MIGRATION_DOCS_SQL_STORE"):
+        core._get_sql_store()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("jobs", [None, 1, 2])
+def test_collect_hashes(mocker, settings, tmp_path, jobs):
+    """Migration files are hashed in bulk with a pool of threads"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    executor = mocker.spy(core.concurrent.futures, "ThreadPoolExecutor")
+
+    migrations = core.Migrations(jobs=jobs)
+    migrations.collect_hashes(migrations.filter("name", "0001_initial"))
+    assert migrations["tests.0001_initial"]._cached_hash == "4fc52e2588468f2922700a07cedb05fb"
+    assert migrations["tests.0002_testmodel_field2"]._cached_hash is None
+    assert not executor.called
+
+    migrations.collect_hashes()
+    assert [migration._cached_hash for migration in migrations] == [
+        core._hash_source(inspect.getsource(inspect.getmodule(migration._node)))
+        for migration in migrations
+    ]
+    if jobs == 1:
+        assert not executor.called
+    else:
+        executor.assert_called_once_with(max_workers=jobs)
+
+    # Migrations that are already hashed are skipped
+    migrations.collect_hashes()
+    assert executor.call_count <= 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("contents", ["{invalid json", '{"version": 0, "hashes": {}}'])
+def test_migration_hash_cache_invalid(mocker, settings, tmp_path, contents):
+    """Invalid caches and caches from other versions are ignored"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    mocker.patch("time.time_ns", return_value=time.time_ns() + 10_000_000_000)
+    (tmp_path / "hashes.json").write_text(contents)
+
+    migrations = core.Migrations()
+    assert migrations._hash_cache.data == {}
+    assert migrations["tests.0001_initial"].hash == "4fc52e2588468f2922700a07cedb05fb"
+    migrations._hash_cache.save()
+    assert len(json.loads((tmp_path / "hashes.json").read_text())["hashes"]) == 1
+
+
+@pytest.mark.django_db
+def test_migration_hash_cache_recently_modified(mocker, settings, tmp_path):
+    """Files modified moments ago are not cached"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    mocker.patch("time.time_ns", return_value=0)
+
+    migrations = core.Migrations()
+    assert migrations["tests.0001_initial"].hash == "4fc52e2588468f2922700a07cedb05fb"
+    migrations._hash_cache.save()
+    assert not (tmp_path / "hashes.json").exists()
+
+
+def test_migration_files(mocker):
+    """
+    Migration files are found without importing migrations or using the
+    database. Their hashes match the hashes of the loaded migrations
+    """
+    mocker.patch.dict(sys.modules)
+    for module_name in list(sys.modules):
+        if module_name.startswith("migration_docs.tests.migrations"):
+            del sys.modules[module_name]
+
+    migration_files = core.MigrationFiles()
+
+    assert not any(
+        module_name.startswith("migration_docs.tests.migrations.0") for module_name in sys.modules
+    )
+    assert sorted(migration_files) == [
+        "tests.0001_initial",
+        "tests.0002_testmodel_field2",
+        "tests.0003_testmodel_field3",
+    ]
+    assert migration_files._hash_cache.digest(migration_files["tests.0001_initial"]) == (
+        "4fc52e2588468f2922700a07cedb05fb"
+    )
+
+
+def test_migration_files_squashed(mocker, settings, tmp_path):
+    """Squashed migrations replace the migrations that they squash"""
+    migrations_dir = tmp_path / "squashed_migrations"
+    migrations_dir.mkdir()
+    (migrations_dir / "__init__.py").write_text("")
+    (migrations_dir / "0001_initial.py").write_text("raise RuntimeError\n")
+    (migrations_dir / "0002_change.py").write_text("raise RuntimeError\n")
+    (migrations_dir / "0001_squashed_0002_change.py").write_text(
+        "raise RuntimeError\n"
+        "class Migration:\n"
+        '    replaces = [("tests", "0001_initial"), ("tests", "0002_change")]\n'
+    )
+    (migrations_dir / "0003_other.py").write_text("# replaces nothing\n")
+    (migrations_dir / "_private.py").write_text("")
+    mocker.patch.object(sys, "path", [str(tmp_path), *sys.path])
+    settings.MIGRATION_MODULES = {"tests": "squashed_migrations", "migration_docs": None}
+
+    assert sorted(core.MigrationFiles()) == [
+        "tests.0001_squashed_0002_change",
+        "tests.0003_other",
+    ]
+
+    # Apps with missing or namespace migration packages have no migrations
+    (migrations_dir / "__init__.py").unlink()
+    settings.MIGRATION_MODULES = {"tests": "squashed_migrations", "migration_docs": "missing.pkg"}
+    assert not core.MigrationFiles()
+
+
+def test_migration_files_cached_replaces(mocker, settings, tmp_path):
+    """Migration files are only read to find squashed migrations when they change"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path / "cache")
+    migrations_dir = tmp_path / "squashed_migrations"
+    migrations_dir.mkdir()
+    (migrations_dir / "__init__.py").write_text("")
+    (migrations_dir / "0001_initial.py").write_text("")
+    squashed_file = migrations_dir / "0001_squashed_0002_change.py"
+    squashed_file.write_text(
+        "class Migration:\n"
+        '    replaces = [("tests", "0001_initial"), ("tests", "0002_change")]\n'
+    )
+    mocker.patch.object(sys, "path", [str(tmp_path), *sys.path])
+    settings.MIGRATION_MODULES = {"tests": "squashed_migrations", "migration_docs": None}
+    mocker.patch("time.time_ns", return_value=time.time_ns() + 10_000_000_000)
+    replaces = mocker.spy(core.MigrationHashCache, "replaces")
+    parse_replaces = mocker.spy(core, "_parse_replaces")
+
+    migration_files = core.MigrationFiles()
+    assert list(migration_files) == ["tests.0001_squashed_0002_change"]
+    assert parse_replaces.call_count == 1
+    migration_files._hash_cache.save()
+
+    assert list(core.MigrationFiles()) == ["tests.0001_squashed_0002_change"]
+    assert replaces.call_count == 4
+    assert parse_replaces.call_count == 1
+
+    # Changed files are read again
+    squashed_file.write_text("class Migration:\n    replaces = []\n")
+    os.utime(squashed_file, ns=(1, 1))
+    assert sorted(core.MigrationFiles()) == [
+        "tests.0001_initial",
+        "tests.0001_squashed_0002_change",
+    ]
+    assert parse_replaces.call_count == 2
+
+
+def test_migration_files_changed(mocker, settings, tmp_path):
+    """Only the given migration files are considered when checking changed files"""
+    migrations_dir = os.path.join(os.path.dirname(core.__file__), "tests", "migrations")
+    migration_files = core.MigrationFiles(
+        paths=[
+            os.path.join(migrations_dir, "0002_testmodel_field2.py"),
+            os.path.relpath(os.path.join(migrations_dir, "0003_testmodel_field3.py")),
+            os.path.join(migrations_dir, "0004_deleted.py"),
+            os.path.join(migrations_dir, "__init__.py"),
+            os.path.join(migrations_dir, "README.md"),
+            "README.md",
+        ]
+    )
+    assert sorted(migration_files) == [
+        "tests.0002_testmodel_field2",
+        "tests.0003_testmodel_field3",
+    ]
+    assert migration_files._removed == {"tests.0004_deleted"}
+
+    # Migrations replaced by changed squashed migrations are removed
+    squashed_dir = tmp_path / "squashed_migrations"
+    squashed_dir.mkdir()
+    (squashed_dir / "__init__.py").write_text("")
+    (squashed_dir / "0001_squashed_0002_change.py").write_text(
+        "class Migration:\n"
+        '    replaces = [("tests", "0001_initial"), ("tests", "0002_change")]\n'
+    )
+    mocker.patch.object(sys, "path", [str(tmp_path), *sys.path])
+    settings.MIGRATION_MODULES = {"tests": "squashed_migrations", "migration_docs": None}
+    migration_files = core.MigrationFiles(
+        paths=[str(squashed_dir / "0001_squashed_0002_change.py")]
+    )
+    assert list(migration_files) == ["tests.0001_squashed_0002_change"]
+    assert migration_files._removed == {"tests.0001_initial", "tests.0002_change"}
+
+
+def test_get_git_changed_files(tmp_path, monkeypatch):
+    """
+    Files changed since a git ref include uncommitted, deleted, renamed, and
+    untracked files
+    """
+
+    def git(*args):
+        subprocess.run(["git", *args], check=True, capture_output=True, cwd=tmp_path)
+
+    git("init")
+    (tmp_path / ".gitignore").write_text("ignored.py\n")
+    for file_name in ["changed.py", "deleted.py", "unchanged.py"]:
+        (tmp_path / file_name).write_text("")
+    (tmp_path / "0002_b.py").write_text("from django.db import migrations\n")
+    git("add", ".")
+    git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-m", "init")
+
+    (tmp_path / "changed.py").write_text("changed")
+    (tmp_path / "deleted.py").unlink()
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "untracked.py").write_text("")
+    (tmp_path / "ignored.py").write_text("")
+    git("mv", "0002_b.py", "0002_renamed.py")
+    monkeypatch.chdir(tmp_path / "sub")
+
+    root = os.path.realpath(
+        subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True
+        ).stdout.strip()
+    )
+    assert sorted(core._get_git_changed_files("HEAD")) == [
+        os.path.join(root, "0002_b.py"),
+        os.path.join(root, "0002_renamed.py"),
+        os.path.join(root, "changed.py"),
+        os.path.join(root, "deleted.py"),
+        os.path.join(root, "sub", "untracked.py"),
+    ]
+
+    with pytest.raises(RuntimeError, match='Could not find files changed since "missing"'):
+        core._get_git_changed_files("missing")
+
+
+def test_watch(mocker, settings, tmp_path):
+    """Watching stops after a number of polls and only checks when files change"""
+    settings.MIGRATION_DOCS_CACHE_DIR = str(tmp_path)
+    sleep = mocker.patch("time.sleep", autospec=True)
+    check = mocker.spy(core, "_check_migrations")
+
+    core.watch(msg=core._no_msg, interval=0.1, polls=3)
+    assert sleep.call_count == 2
+    assert check.call_count == 1
+    watched = core._get_watched_files(core._get_migration_dirs())
+    migrations_dir = os.path.join(os.path.dirname(core.__file__), "tests", "migrations")
+    assert os.path.join(migrations_dir, "0001_initial.py") in watched
+
+    # Errors are shown and checked again when files change
+    msg = mocker.Mock()
+    mocker.patch.object(
+        core,
+        "_get_watched_files",
+        autospec=True,
+        side_effect=[FileNotFoundError("Removed."), {"a": (1, 1)}, {"a": (1, 1)}, {"a": (2, 1)}],
+    )
+    check = mocker.patch.object(
+        core,
+        "_check_migrations",
+        side_effect=[RuntimeError("django-migration-docs: docs.yaml is corrupt."), True],
+    )
+    core.watch(msg=msg, interval=0.1, polls=4)
+    assert check.call_count == 2
+    msg.assert_any_call("Removed.", fg="red")
+    msg.assert_any_call("django-migration-docs: docs.yaml is corrupt.", fg="red")
+
+
+def test_migration_docs_batch(mocker, tmp_path):
+    """Saving docs is deferred until the outermost batch exits"""
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+    docs_file = tmp_path / "docs.yaml"
+    docs = core.MigrationDocs()
+
+    with docs.batch():
+        docs["tests.0001_initial"] = None
+        docs.save()
+        with docs.batch():
+            docs["tests.0002_testmodel_field2"] = None
+            docs.save()
+        assert not docs_file.exists()
+
+    assert core.MigrationDocs().data == {
+        "tests.0001_initial": None,
+        "tests.0002_testmodel_field2": None,
+    }
+
+    # Nothing is written when docs weren't saved in the batch
+    docs_file.unlink()
+    with docs.batch():
+        pass
+    assert not docs_file.exists()
+
+    # Docs are written when the batch is interrupted
+    with pytest.raises(KeyboardInterrupt):
+        with docs.batch():
+            docs["tests.0003_testmodel_field3"] = None
+            docs.save()
+            raise KeyboardInterrupt
+
+    assert len(core.MigrationDocs()) == 3
+
+
+def test_migration_docs_save(mocker, tmp_path):
+    """
+    Docs are dumped exactly like they were with ``yaml.Dumper`` without
+    registering representers on it, and are loaded back unchanged
+    """
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+    sql = 'ALTER TABLE "tests_testmodel" ADD COLUMN "field2" varchar(100) DEFAULT \'test\' \n' * 5
+    data = {
+        "tests.0002_testmodel_field2": {"_hash": "85d60942ace5acbdd2744d5ba88cbc4a", "sql": sql},
+        "tests.0001_initial": {"_hash": "4fc52e2588468f2922700a07cedb05fb", "sql": "SELECT 1;"},
+        "tests.0003_testmodel_field3": None,
+    }
+
+    core.MigrationDocs(data=data).save()
+
+    assert (
+        yaml.Dumper.yaml_representers[collections.OrderedDict]
+        is yaml.representer.Representer.represent_ordered_dict
+    )
+
+    class LegacyDumper(yaml.Dumper):
+        pass
+
+    LegacyDumper.add_representer(
+        collections.OrderedDict,
+        lambda dumper, data: dumper.represent_mapping("tag:yaml.org,2002:map", data.items()),
+    )
+    expected = yaml.dump(collections.OrderedDict(sorted(data.items())), Dumper=LegacyDumper)
+    assert (tmp_path / "docs.yaml").read_text() == expected
+    assert core.MigrationDocs().data == data
+
+
+def test_sharded_migration_docs(mocker, tmp_path):
+    """Shards are loaded lazily and only changed shards are saved"""
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+    shards_dir = tmp_path / "docs"
+    shards_dir.mkdir()
+    (shards_dir / "app1.yaml").write_text("app1.0001_initial:\n  type: before\n")
+    (shards_dir / "app2.yaml").write_text("app2.0001_initial:\n  type: after\n")
+    (shards_dir / "README").write_text("Not a shard")
+
+    docs = core.MigrationDocs()
+    assert docs["app1.0001_initial"] == {"type": "before"}
+    assert "app1.0002_other" not in docs
+    assert docs.get("app3.0001_initial") is None
+    assert set(docs._shard_texts) == {"app1", "app3"}
+
+    docs["app1.0002_other"] = None
+    docs["app3.0001_initial"] = {"type": "after"}
+    write = mocker.spy(core, "_write_docs_file")
+    docs.save()
+    assert write.call_count == 2
+    assert (shards_dir / "app1.yaml").read_text() == (
+        "app1.0001_initial:\n  type: before\napp1.0002_other: null\n"
+    )
+    assert (shards_dir / "app3.yaml").read_text() == "app3.0001_initial:\n  type: after\n"
+
+    # Unchanged shards are not written again
+    os.utime(shards_dir / "app1.yaml", ns=(0, 0))
+    docs.save()
+    assert (shards_dir / "app1.yaml").stat().st_mtime_ns == 0
+
+    # Shards of apps without docs are removed
+    del docs["app3.0001_initial"]
+    docs.save()
+    assert not (shards_dir / "app3.yaml").exists()
+
+    # Iterating loads every shard
+    assert sorted(core.MigrationDocs()) == [
+        "app1.0001_initial",
+        "app1.0002_other",
+        "app2.0001_initial",
+    ]
+
+    # Replacing the docs replaces every shard
+    docs = core.MigrationDocs()
+    docs.data = {"app2.0001_initial": None}
+    docs.save()
+    assert sorted(path.name for path in shards_dir.iterdir()) == ["README", "app2.yaml"]
+
+
+def test_sharded_migration_docs_invalid(mocker, tmp_path):
+    """Corrupt shards and ambiguous layouts raise errors"""
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "app1.yaml").write_text("[invalid yaml")
+
+    docs = core.MigrationDocs()
+    with pytest.raises(RuntimeError, match="docs/app1.yaml is corrupt"):
+        docs.get("app1.0001_initial")
+
+    (tmp_path / "docs.yaml").write_text("{}")
+    with pytest.raises(RuntimeError, match="Found both"):
+        core.MigrationDocs()
+
+
+def test_migration_docs_index(mocker, tmp_path):
+    """Parsed docs are read from a compiled index until the docs file changes"""
+    mocker.patch(
+        "migration_docs.core._get_migration_docs_file_root",
+        return_value=str(tmp_path),
+        autospec=True,
+    )
+    docs_file = tmp_path / "docs.yaml"
+    index_file = tmp_path / "cache" / "docs.yaml.marshal"
+    docs_file.write_text("tests.0001_initial:\n  type: before\n")
+    yaml_load = mocker.spy(yaml, "load")
+
+    assert core.MigrationDocs().data == {"tests.0001_initial": {"type": "before"}}
+    assert yaml_load.call_count == 1
+    assert index_file.exists()
+
+    # The index is used while the docs file is unchanged
+    assert core.MigrationDocs().data == {"tests.0001_initial": {"type": "before"}}
+    assert yaml_load.call_count == 1
+
+    # The index is rebuilt when saving
+    docs = core.MigrationDocs()
+    docs["tests.0002_testmodel_field2"] = None
+    docs.save()
+    assert len(core.MigrationDocs()) == 2
+    assert yaml_load.call_count == 1
+
+    # Changing the docs file invalidates the index
+    docs_file.write_text("tests.0001_initial:\n  type: after\n")
+    assert core.MigrationDocs().data == {"tests.0001_initial": {"type": "after"}}
+    assert yaml_load.call_count == 2
+
+    # Indices of other versions or corrupt indices are ignored
+    mocker.patch("migration_docs.core.__version__", "0.0.0")
+    assert len(core.MigrationDocs()) == 1
+    assert yaml_load.call_count == 3
+    index_file.write_bytes(b"corrupt")
+    assert len(core.MigrationDocs()) == 1
+    assert yaml_load.call_count == 4
+    index_file.write_bytes(marshal.dumps(["not", "an", "index"]))
+    assert len(core.MigrationDocs()) == 1
+    assert yaml_load.call_count == 5
+
+    # Docs with values that marshal doesn't support aren't indexed
+    index_file.unlink()
+    docs_file.write_text("tests.0001_initial:\n  date: 2024-01-01\n")
+    assert core.MigrationDocs().data == {"tests.0001_initial": {"date": datetime.date(2024, 1, 1)}}
+    assert not index_file.exists()
+
+
+def test_show_environment(mocker, tmp_path):
+    """
+    Show environments are reused and compiled templates are cached across
+    environments
+    """
+    file_root = tmp_path / ".migration-docs"
+    file_root.mkdir()
+    cache_root = str(tmp_path / "cache")
+    core._get_show_environment.cache_clear()
+    compile_template = mocker.spy(jinja2.Environment, "compile")
+
+    env = core._get_show_environment(str(file_root), cache_root)
+    assert env is core._get_show_environment(str(file_root), cache_root)
+    assert env.get_template("show.tpl").render(migrations=[]) == ""
+    with pytest.raises(jinja2.exceptions.TemplateNotFound):
+        env.get_template("show_invalid.tpl")
+
+    # User templates replace the default template once they are added
+    (file_root / "show.tpl").write_text("{{ migrations|length }} migrations")
+    assert env.get_template("show.tpl").render(migrations=[]) == "0 migrations"
+    assert compile_template.call_count == 2
+
+    # Other processes load compiled templates from the bytecode cache
+    core._get_show_environment.cache_clear()
+    env = core._get_show_environment(str(file_root), cache_root)
+    assert env.get_template("show.tpl").render(migrations=[1]) == "1 migrations"
+    assert compile_template.call_count == 2
+    assert len(os.listdir(os.path.join(cache_root, "templates"))) == 2
+
+
+@pytest.mark.django_db
+def test_get_applied_migrations(mocker, tmp_path):
+    """Applied migrations of databases are queried concurrently with a timeout"""
+    core.profiling.start_tracing(str(tmp_path / "trace.json"))
+    try:
+        applied = core._get_applied_migrations(["default"], timeout=30)
+    finally:
+        core.profiling.stop_tracing()
+
+    assert list(applied) == ["default"]
+    assert ("tests", "0001_initial") in applied["default"]
+
+    # Every query is traced on the track of its thread
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    queries = [event for event in events if event["name"] == "query database"]
+    assert [event["args"] for event in queries] == [{"alias": "default"}]
+    assert queries[0]["tid"] != threading.get_ident()
+
+    with pytest.raises(RuntimeError, match='"missing" database'):
+        core._get_applied_migrations(["default", "missing"])
+
+    released = threading.Event()
+    mocker.patch.object(
+        core.django_migration_recorder.MigrationRecorder,
+        "applied_migrations",
+        autospec=True,
+        side_effect=lambda recorder: released.wait(),
+    )
+    try:
+        with pytest.raises(RuntimeError, match='Timed out after 0.1 seconds .* "default"'):
+            core._get_applied_migrations(["default"], timeout=0.1)
+    finally:
+        released.set()
+
+
+@pytest.mark.django_db
+def test_migrations_applied_on(mocker):
+    """Migrations expose the applied status of every queried database"""
+    migrations = core.Migrations()
+    assert migrations.databases == ["default"]
+    assert migrations["tests.0001_initial"].applied_on == {"default": True}
+
+    get_applied_migrations = mocker.patch(
+        "migration_docs.core._get_applied_migrations",
+        autospec=True,
+        return_value={
+            "default": {("tests", "0001_initial"): None},
+            "replica": {},
+        },
+    )
+    migrations = core.Migrations(databases="all", timeout=5)
+    get_applied_migrations.assert_called_once_with(["default"], timeout=5)
+
+    migrations = core.Migrations(databases=["replica"])
+    assert migrations.databases == ["default", "replica"]
+    assert migrations["tests.0001_initial"].applied
+    assert migrations["tests.0001_initial"].applied_on == {"default": True, "replica": False}
+    assert not migrations["tests.0002_testmodel_field2"].applied
+    assert [migration.label for migration in migrations.filter("applied", False)] == [
+        "tests.0002_testmodel_field2",
+        "tests.0003_testmodel_field3",
+    ]
@@ -0,0 +1,195 @@
+"""Unit tests for the daemon and client migration_docs modules"""
+
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import types
+
+import pytest
+
+from migration_docs import client, core, daemon
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "daemon.sock")
+
+
+def test_client_import_does_not_import_django_orm():
+    """The client starts quickly because it does not set up Django"""
+    modules = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, migration_docs.client; print(sorted(sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert "'migration_docs.client'" in modules
+    assert "'migration_docs.core'" not in modules
+    assert "'django.db'" not in modules
+
+
+def test_client_main(mocker, monkeypatch):
+    """Verifies the client passes the subcommand to the daemon on the socket"""
+    request = mocker.patch.object(client, "request", autospec=True, return_value=1)
+    monkeypatch.delenv("MIGRATION_DOCS_SOCKET", raising=False)
+
+    assert client.main(["show", "--unapplied"]) == 1
+    request.assert_called_once_with(
+        client.DEFAULT_SOCKET, ["show", "--unapplied"], timeout=client.DEFAULT_TIMEOUT
+    )
+
+    monkeypatch.setenv("MIGRATION_DOCS_SOCKET", "env.sock")
+    client.main(["check"])
+    request.assert_called_with("env.sock", ["check"], timeout=client.DEFAULT_TIMEOUT)
+
+    client.main(["--socket", "arg.sock", "--timeout", "5", "check", "--fast"])
+    request.assert_called_with("arg.sock", ["check", "--fast"], timeout=5)
+
+    with pytest.raises(SystemExit):
+        client.main(["sync"])
+
+
+def test_client_without_daemon(socket_path):
+    stderr = io.StringIO()
+    assert client.request(socket_path, ["check"], stderr=stderr) == 2
+    assert stderr.getvalue() == (
+        f"django-migration-docs: No daemon is listening on {socket_path}."
+        ' Start one with "manage.py migration_docs serve".\n'
+    )
+
+
+def test_client_closed_connection(socket_path):
+    """The client fails when the daemon closes the connection without a response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+
+        def close():
+            conn, _ = server.accept()
+            conn.close()
+
+        thread = threading.Thread(target=close)
+        thread.start()
+        stderr = io.StringIO()
+        assert client.request(socket_path, ["check"], stderr=stderr) == 2
+        thread.join()
+
+    assert stderr.getvalue() == "django-migration-docs: The daemon closed the connection.\n"
+
+
+def test_client_timeout(socket_path):
+    """The client gives up when the daemon doesn't respond"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen(0)
+
+        stderr = io.StringIO()
+        assert client.request(socket_path, ["check"], stderr=stderr, timeout=0.1) == 2
+        assert (
+            stderr.getvalue() == "django-migration-docs: The daemon didn't respond within 0.1s.\n"
+        )
+
+        # The connection is still queued, which fills the backlog of the daemon
+        stderr = io.StringIO()
+        assert client.request(socket_path, ["check"], stderr=stderr, timeout=0.1) == 2
+        assert stderr.getvalue() == (
+            f"django-migration-docs: The daemon listening on {socket_path} is busy.\n"
+        )
+
+
+def test_serve_already_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+
+        with pytest.raises(RuntimeError, match="already listening"):
+            daemon.serve(socket_path, msg=core._no_msg)
+
+    # Sockets of daemons that stopped are replaced
+    assert os.path.exists(socket_path)
+    daemon.serve(socket_path, idle_timeout=0.01, msg=core._no_msg)
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.django_db
+def test_serve_requests(socket_path, mocker, monkeypatch):
+    """Verifies requests that are not run and the default socket path"""
+    monkeypatch.setattr(daemon, "REQUEST_TIMEOUT", 0.1)
+    mocker.patch.object(core, "_get_migration_docs_cache_path", return_value="unused.sock")
+    monkeypatch.delenv("MIGRATION_DOCS_SOCKET", raising=False)
+    assert daemon._get_socket_path() == "unused.sock"
+    monkeypatch.setenv("MIGRATION_DOCS_SOCKET", socket_path)
+
+    thread = threading.Thread(target=daemon.serve, kwargs={"idle_timeout": 1})
+    thread.start()
+    for _ in range(500):
+        if os.path.exists(socket_path):
+            break
+
+        thread.join(0.01)
+
+    def raw_request(message):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(socket_path)
+            with conn.makefile("rwb") as f:
+                if message is not None:
+                    client.send(f, message)
+                    return client.receive(f)
+                else:
+                    f.write(b"invalid\n")
+
+    try:
+        # Clients that don't send requests don't block other clients for long
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(socket_path)
+            stderr = io.StringIO()
+            assert client.request(socket_path, ["check", "--invalid"], stderr=stderr) == 1
+
+        # Invalid requests get no response
+        assert raw_request(None) is None
+        assert raw_request(["check"]) is None
+        assert raw_request({"argv": [], "cwd": os.getcwd()})["exit_code"] == 2
+        assert raw_request({"argv": ["check"], "cwd": "/"}) == {
+            "exit_code": 2,
+            "stdout": "",
+            "stderr": (
+                f"django-migration-docs: The daemon serves {os.path.realpath(os.getcwd())}."
+                " Run the client from there.\n"
+            ),
+        }
+    finally:
+        thread.join()
+
+
+def test_unload_changed_migrations(tmp_path, monkeypatch):
+    """Modules of changed migration files are imported again"""
+    changed = tmp_path / "0001_initial.py"
+    unchanged = tmp_path / "0002_second.py"
+    for path in (changed, unchanged):
+        monkeypatch.setitem(sys.modules, f"migrations.{path.stem}", types.ModuleType(path.stem))
+        sys.modules[f"migrations.{path.stem}"].__file__ = str(path)
+
+    daemon._unload_changed_migrations(
+        {str(changed): (1, 1), str(unchanged): (1, 1)},
+        {str(changed): (2, 1), str(unchanged): (1, 1), str(tmp_path / "0003_new.py"): (1, 1)},
+    )
+    assert "migrations.0001_initial" not in sys.modules
+    assert "migrations.0002_second" in sys.modules
+
+
+def test_send_and_receive():
+    f = io.BytesIO()
+    client.send(f, {"argv": ["check"]})
+    assert json.loads(f.getvalue()) == {"argv": ["check"]}
+
+    f.seek(0)
+    assert client.receive(f) == {"argv": ["check"]}
+    assert client.receive(f) is None
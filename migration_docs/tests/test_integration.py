@@ -1,6 +1,12 @@
 """Integration tests for django-migration-docs"""
 
+import io
+import json
+import os
+import re
 import subprocess
+import threading
+import time
 from contextlib import ExitStack as does_not_raise
 from unittest import mock
 
@@ -9,9 +15,10 @@ import formaldict
 import jinja2.exceptions
 import pytest
 import yaml
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 
-from migration_docs import core, utils
+import migration_docs
+from migration_docs import apps, client, core, utils
 
 
 @pytest.fixture()
@@ -137,6 +144,41 @@ def test_migration_docs_show(
         assert captured.out == expected_output
 
 
+@pytest.mark.django_db
+def test_migration_docs_show_stream(migration_docs_config):
+    """Streamed docs are rendered in chunks that match the full output"""
+    chunks = core.show(stream=True)
+    assert not isinstance(chunks, str)
+    assert (
+        "".join(chunks)
+        == core.show()
+        == (
+            "# Deployment order: unknown\n"
+            "[X] tests.0001_initial\n"
+            "[X] tests.0002_testmodel_field2\n"
+            "[X] tests.0003_testmodel_field3\n"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_migration_docs_show_databases(capsys, migration_docs_config):
+    """Integration test for showing the applied status of every database"""
+    (migration_docs_config / "show.tpl").write_text(
+        "{{ migrations.databases }}\n"
+        "{% for migration in migrations %}\n"
+        "{{ migration.label }} {{ migration.applied_on.default }}\n"
+        "{% endfor %}\n"
+    )
+    call_command("migration_docs", "show", "--database=all", "--database-timeout=10")
+    assert capsys.readouterr().out == (
+        "['default']\n"
+        "tests.0001_initial True\n"
+        "tests.0002_testmodel_field2 True\n"
+        "tests.0003_testmodel_field3 True\n"
+    )
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "initial_docs, pre_sync_hooks, user_input, expected_output, expected_docs",
@@ -363,6 +405,119 @@ def test_migration_docs_sync(
         assert yaml.safe_load(f) == expected_docs
 
 
+@pytest.mark.django_db
+def test_migration_docs_sync_fingerprints(capsys, settings, migration_docs_config):
+    """
+    Syncing switches up-to-date docs to the configured kind of fingerprint
+    without collecting their SQL again
+    """
+    docs_file = migration_docs_config / "docs.yaml"
+    docs = {
+        migration.label: {"_hash": migration.hash, "atomic": True, "sql": "kept"}
+        for migration in core.Migrations()
+    }
+    docs_file.write_text(yaml.dump(docs))
+
+    settings.MIGRATION_DOCS_FINGERPRINT = "ast"
+    assert core.check(msg=core._no_msg)
+    call_command("migration_docs", "sync")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Updated the fingerprints of 3 migration doc(s).\n"
+        "django-migration-docs: Successfully synced migration docs.\n"
+    )
+
+    with open(docs_file, "r") as f:
+        synced_docs = yaml.safe_load(f)
+    assert all(docs["_hash"].startswith("ast:") for docs in synced_docs.values())
+    assert all(docs["sql"] == "kept" for docs in synced_docs.values())
+
+    settings.MIGRATION_DOCS_FINGERPRINT = "source"
+    assert core.check(msg=core._no_msg)
+
+
+@pytest.mark.django_db
+def test_migration_docs_sql_store(capsys, settings, migration_docs_config):
+    """
+    Integration test for storing SQL in blobs, moving SQL between stores
+    when syncing, and removing unreferenced blobs
+    """
+    docs_file = migration_docs_config / "docs.yaml"
+    sql_root = migration_docs_config / "sql"
+    docs = {
+        migration.label: {"_hash": migration.hash, "atomic": True, "sql": f"{migration.label} SQL"}
+        for migration in core.Migrations()
+    }
+    docs_file.write_text(yaml.dump(docs))
+
+    settings.MIGRATION_DOCS_SQL_STORE = "blobs"
+    call_command("migration_docs", "sync")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Moved the SQL of 3 migration doc(s) to the blobs SQL store.\n"
+        "django-migration-docs: Successfully synced migration docs.\n"
+    )
+    with open(docs_file, "r") as f:
+        synced_docs = yaml.safe_load(f)
+    assert all("sql" not in docs and len(docs["_sql"]) == 64 for docs in synced_docs.values())
+    assert len(os.listdir(sql_root)) == 3
+
+    # SQL of up-to-date docs is loaded from blobs
+    migrations = core.Migrations()
+    assert migrations["tests.0002_testmodel_field2"].sql == "tests.0002_testmodel_field2 SQL"
+    assert migrations._migrations["tests.0001_initial"]._cached_sql is None
+
+    # Blobs of stale docs are replaced
+    synced_docs["tests.0001_initial"]["_hash"] = "stale"
+    docs_file.write_text(yaml.dump(synced_docs))
+    call_command("migration_docs", "sync")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Found 1 stale migration doc(s). Docs updated automatically.\n"
+        "django-migration-docs: Removed 1 unreferenced SQL blob(s).\n"
+        "django-migration-docs: Successfully synced migration docs.\n"
+    )
+    assert "CREATE TABLE" in core.Migrations()["tests.0001_initial"].sql
+
+    (sql_root / f"{'0' * 64}.sql").write_text("orphaned")
+    call_command("migration_docs", "gc")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Removed 1 unreferenced SQL blob(s).\n"
+    )
+
+    # SQL is moved back into the docs files
+    settings.MIGRATION_DOCS_SQL_STORE = "inline"
+    call_command("migration_docs", "sync")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Moved the SQL of 3 migration doc(s) to the inline SQL store.\n"
+        "django-migration-docs: Removed 3 unreferenced SQL blob(s).\n"
+        "django-migration-docs: Successfully synced migration docs.\n"
+    )
+    with open(docs_file, "r") as f:
+        synced_docs = yaml.safe_load(f)
+    assert synced_docs["tests.0003_testmodel_field3"]["sql"] == "tests.0003_testmodel_field3 SQL"
+    assert "_sql" not in synced_docs["tests.0003_testmodel_field3"]
+
+
+@pytest.mark.django_db
+def test_migration_docs_sync_interrupted(capsys, mocker, migration_docs_config):
+    """
+    Docs are written once when syncing, and docs that were entered before an
+    interrupted prompt are kept
+    """
+    docs_file = migration_docs_config / "docs.yaml"
+    mocker.patch.object(
+        formaldict.Schema, "prompt", side_effect=[{"type": "before"}, KeyboardInterrupt]
+    )
+    save = mocker.spy(core.MigrationDocs, "_write")
+
+    with pytest.raises(KeyboardInterrupt):
+        call_command("migration_docs", "sync")
+
+    assert save.call_count == 1
+    with open(docs_file, "r") as f:
+        docs = yaml.safe_load(f)
+    assert list(docs) == ["tests.0001_initial"]
+    assert docs["tests.0001_initial"]["type"] == "before"
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "initial_docs, management_args, user_input, expected_output, expected_docs",
@@ -545,6 +700,10 @@ def test_migration_docs_update(
         ),
     ],
 )
+@pytest.mark.parametrize(
+    "management_args",
+    [[], ["--fast"], ["--verify-hashes"], ["--jobs", "1"], ["--fast", "--jobs", "2"]],
+)
 def test_migration_docs_check(
     capsys,
     mocker,
@@ -552,6 +711,7 @@ def test_migration_docs_check(
     initial_docs,
     expected_output,
     expected_exit_code,
+    management_args,
 ):
     """
     Integration test for manage.py migration_docs check
@@ -561,12 +721,104 @@ def test_migration_docs_check(
     with open(docs_file, "w+") as f:
         f.write(yaml.safe_dump(initial_docs))
 
-    call_command("migration_docs", "check")
+    call_command("migration_docs", "check", *management_args)
     captured = capsys.readouterr()
     assert captured.out == expected_output
     patched_exit.assert_called_once_with(expected_exit_code)
 
 
+@pytest.mark.parametrize("management_args", [["--jobs", "0"], ["--fast", "--jobs", "-1"]])
+def test_migration_docs_check_invalid_jobs(management_args):
+    """The number of jobs must be positive"""
+    with pytest.raises(CommandError, match="is not a positive integer"):
+        call_command("migration_docs", "check", *management_args)
+
+
+def test_migration_docs_check_changed(capsys, mocker, migration_docs_config):
+    """Integration test for checking the docs of changed migration files"""
+    patched_exit = mocker.patch("sys.exit", autospec=True)
+    migrations_dir = os.path.join(os.path.dirname(core.__file__), "tests", "migrations")
+    (migration_docs_config / "docs.yaml").write_text(
+        yaml.safe_dump(
+            {
+                "tests.0001_initial": {"_hash": "outdated_hash"},
+                "tests.0002_testmodel_field2": {"_hash": "outdated_hash"},
+                "tests.0003_testmodel_field3": {"_hash": "da668fdffa3bb9435bf9773b0637fc8a"},
+                "tests.0004_deleted": None,
+                "tests.0005_deleted": None,
+            }
+        )
+    )
+    mocker.patch(
+        "migration_docs.core._get_git_changed_files",
+        autospec=True,
+        return_value=[
+            os.path.join(migrations_dir, "0002_testmodel_field2.py"),
+            os.path.join(migrations_dir, "0004_deleted.py"),
+        ],
+    )
+    digest = mocker.spy(core.MigrationHashCache, "digest")
+
+    call_command("migration_docs", "check", "--since", "origin/main")
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Found 1 stale migration doc(s).\n"
+        "django-migration-docs: Found docs for 1 deleted migration(s).\n"
+        'django-migration-docs: Run "manage.py migration_docs sync" to fix errors.\n'
+    )
+    patched_exit.assert_called_once_with(1)
+    assert [call.args[1] for call in digest.call_args_list] == [
+        os.path.join(migrations_dir, "0002_testmodel_field2.py")
+    ]
+
+    call_command(
+        "migration_docs",
+        "check",
+        "--files",
+        os.path.join(migrations_dir, "0003_testmodel_field3.py"),
+    )
+    assert capsys.readouterr().out == "django-migration-docs: Migration docs are up to date.\n"
+    patched_exit.assert_called_with(0)
+
+
+def test_migration_docs_watch(capsys, mocker, migration_docs_config):
+    """Integration test for checking docs every time they change"""
+    docs_file = migration_docs_config / "docs.yaml"
+    docs = {
+        "tests.0001_initial": {"_hash": "4fc52e2588468f2922700a07cedb05fb"},
+        "tests.0002_testmodel_field2": {"_hash": "85d60942ace5acbdd2744d5ba88cbc4a"},
+        "tests.0003_testmodel_field3": {"_hash": "da668fdffa3bb9435bf9773b0637fc8a"},
+    }
+    docs_file.write_text(yaml.safe_dump(docs))
+
+    def sleep(interval):
+        assert interval == 0.5
+        if sleep.calls == 0:
+            docs["tests.0002_testmodel_field2"]["_hash"] = "outdated_hash"
+            docs_file.write_text(yaml.safe_dump(docs))
+        elif sleep.calls == 2:
+            raise KeyboardInterrupt
+
+        sleep.calls += 1
+
+    sleep.calls = 0
+    mocker.patch("time.sleep", autospec=True, side_effect=sleep)
+    read_source = mocker.spy(core, "_read_source")
+
+    call_command("migration_docs", "watch", "--interval", "0.5")
+
+    # Docs are checked when they change, and unchanged files are not hashed again
+    assert re.fullmatch(
+        "django-migration-docs: Watching migration files and docs for changes.\n"
+        "django-migration-docs: Migration docs are up to date.\n"
+        "django-migration-docs: Checked 3 migration\\(s\\) in \\d+ms.\n"
+        "django-migration-docs: Found 1 stale migration doc\\(s\\).\n"
+        'django-migration-docs: Run "manage.py migration_docs sync" to fix errors.\n'
+        "django-migration-docs: Checked 3 migration\\(s\\) in \\d+ms.\n",
+        capsys.readouterr().out,
+    )
+    assert read_source.call_count <= 3
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "initial_docs, expected_exception, expected_output, expected_docs",
@@ -703,10 +955,57 @@ def test_pre_migrate_sync(mocker, settings, pre_migrate_sync, expected_sync_call
     assert len(patched_sync.call_args_list) == expected_sync_call_count
 
 
+@pytest.mark.django_db
+def test_pre_migrate_sync_plan(mocker, settings, migration_docs_config):
+    """
+    The pre_migrate hook only syncs the stale docs of migrations in the plan
+    and migrations that are missing docs
+    """
+    settings.MIGRATION_DOCS_PRE_MIGRATE_SYNC = True
+    sync = mocker.spy(migration_docs, "sync")
+    prompt = mocker.patch.object(formaldict.Schema, "prompt", return_value={})
+    migrations = core.Migrations()
+    plan = [
+        (migrations["tests.0001_initial"]._node, True),
+        (migrations["tests.0002_testmodel_field2"]._node, False),
+    ]
+    docs = {
+        migration.label: {"_hash": "stale", "atomic": True, "sql": ""}
+        for migration in migrations
+        if migration.label != "tests.0003_testmodel_field3"
+    }
+    docs["tests.0004_deleted"] = {"_hash": "deleted"}
+    (migration_docs_config / "docs.yaml").write_text(yaml.dump(docs))
+    blob = migration_docs_config / "sql" / f"{'0' * 64}.sql"
+    blob.parent.mkdir()
+    blob.write_text("")
+
+    apps.sync_docs_on_pre_migrate(plan=plan, interactive=True, using="default")
+    sync.assert_called_once_with(using="default", labels=["tests.0002_testmodel_field2"])
+
+    with open(migration_docs_config / "docs.yaml", "r") as f:
+        synced_docs = yaml.safe_load(f)
+    assert [label for label, docs in synced_docs.items() if docs["_hash"] == "stale"] == [
+        "tests.0001_initial",
+    ]
+
+    # Missing docs are added outside of the plan. Docs of deleted migrations
+    # and unreferenced SQL blobs are left for a full sync
+    assert prompt.call_count == 1
+    assert synced_docs["tests.0003_testmodel_field3"]["_hash"] != "stale"
+    assert "tests.0004_deleted" in synced_docs
+    assert blob.exists()
+
+    # The plan is only synced once
+    apps.sync_docs_on_pre_migrate(plan=plan, interactive=True, using="default")
+    assert sync.call_count == 1
+
+
 @pytest.mark.parametrize(
     "subcommand, expected_exception",
     [
         ("show", does_not_raise()),
+        ("--profile show --unapplied", does_not_raise()),
         ("invalid", pytest.raises(subprocess.CalledProcessError)),
     ],
 )
@@ -714,3 +1013,165 @@ def test_call_management_command(subcommand, expected_exception):
     """Verifies the management command can be called from the shell"""
     with expected_exception:
         utils.shell(f"python manage.py migration_docs {subcommand}")
+
+
+@pytest.mark.django_db
+def test_migration_docs_profile(capsys, mocker, migration_docs_config, tmp_path):
+    """Verifies subcommands can be profiled"""
+    patched_exit = mocker.patch("sys.exit", autospec=True)
+    pstats_path = tmp_path / "check.pstats"
+    call_command("migration_docs", "--profile", "check")
+    call_command("migration_docs", f"--profile-output={pstats_path}", "check", "--fast")
+    assert patched_exit.call_count == 2
+
+    captured = capsys.readouterr()
+    assert "Found no docs for 3 migration(s)" in captured.out
+    assert captured.err.count("Phase") == 2
+    for phase in ["query database", "load migrations", "find migration files", "parse docs"]:
+        assert f"\n{phase} " in captured.err
+    assert f"cProfile stats saved to {pstats_path}" in captured.err
+    assert pstats_path.exists()
+
+
+def test_migration_docs_convert(capsys, migration_docs_config):
+    """
+    Integration test for manage.py migration_docs convert
+    """
+    docs = {
+        "tests.0001_initial": {"_hash": "4fc52e2588468f2922700a07cedb05fb"},
+        "tests.0002_testmodel_field2": None,
+        "other.0001_initial": {"type": "before"},
+    }
+    docs_file = migration_docs_config / "docs.yaml"
+    with open(docs_file, "w+") as f:
+        f.write(yaml.safe_dump(docs))
+
+    call_command("migration_docs", "convert", "sharded")
+    assert not docs_file.exists()
+    assert sorted(path.name for path in (migration_docs_config / "docs").iterdir()) == [
+        "other.yaml",
+        "tests.yaml",
+    ]
+    assert core.MigrationDocs().data == docs
+
+    call_command("migration_docs", "convert", "sharded")
+    call_command("migration_docs", "convert", "single")
+    assert not (migration_docs_config / "docs").exists()
+    with open(docs_file, "r") as f:
+        assert yaml.safe_load(f) == docs
+
+    assert capsys.readouterr().out == (
+        "django-migration-docs: Converted docs to the sharded layout.\n"
+        "django-migration-docs: Docs already use the sharded layout.\n"
+        "django-migration-docs: Converted docs to the single layout.\n"
+    )
+
+    with pytest.raises(ValueError, match="Invalid layout"):
+        core.convert("invalid")
+
+
+@pytest.mark.django_db
+def test_migration_docs_snapshot(
+    capsys, mocker, migration_docs_config, tmp_path, django_assert_num_queries
+):
+    """
+    Integration test for manage.py migration_docs snapshot and showing
+    docs from a snapshot
+    """
+    snapshot_file = tmp_path / "snapshot.json"
+    call_command("migration_docs", "snapshot", str(snapshot_file))
+    assert capsys.readouterr().out.startswith("django-migration-docs: Saved ")
+    snapshot = json.loads(snapshot_file.read_text())
+    assert snapshot["version"] == core.SNAPSHOT_VERSION
+    assert snapshot["database"] == "default"
+    assert snapshot["applied"]["tests"] == [
+        "0001_initial",
+        "0002_testmodel_field2",
+        "0003_testmodel_field3",
+    ]
+
+    # Applied migrations are read from the snapshot without querying the database
+    snapshot["applied"] = {"tests": ["0001_initial"]}
+    snapshot_file.write_text(json.dumps(snapshot))
+    recorder = mocker.spy(core.django_migration_recorder.MigrationRecorder, "applied_migrations")
+    with django_assert_num_queries(0):
+        call_command("migration_docs", "show", "--unapplied", f"--applied-from={snapshot_file}")
+    assert not recorder.called
+    assert capsys.readouterr().out == (
+        "# Deployment order: unknown\n"
+        "[ ] tests.0002_testmodel_field2\n"
+        "[ ] tests.0003_testmodel_field3\n"
+    )
+
+    snapshot["version"] = 0
+    snapshot_file.write_text(json.dumps(snapshot))
+    with pytest.raises(RuntimeError, match="Could not read applied migrations"):
+        core.show(applied_from=str(snapshot_file))
+
+
+@pytest.mark.django_db
+def test_migration_docs_serve(capsys, tmp_path, migration_docs_config):
+    """Integration test for running check and show on the daemon with the client"""
+    docs_file = migration_docs_config / "docs.yaml"
+    docs = {
+        "tests.0001_initial": {"_hash": "4fc52e2588468f2922700a07cedb05fb"},
+        "tests.0002_testmodel_field2": {"_hash": "85d60942ace5acbdd2744d5ba88cbc4a"},
+        "tests.0003_testmodel_field3": {"_hash": "da668fdffa3bb9435bf9773b0637fc8a"},
+    }
+    docs_file.write_text(yaml.safe_dump(docs))
+    socket_path = str(tmp_path / "daemon.sock")
+    thread = threading.Thread(
+        target=call_command,
+        args=("migration_docs", "serve", "--socket", socket_path, "--idle-timeout", "1"),
+    )
+    thread.start()
+    for _ in range(500):
+        if os.path.exists(socket_path):
+            break
+
+        time.sleep(0.01)
+
+    def request(*argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        exit_code = client.request(socket_path, argv, stdout=stdout, stderr=stderr)
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    try:
+        assert request("check") == (
+            0,
+            "django-migration-docs: Migration docs are up to date.\n",
+            "",
+        )
+        exit_code, stdout, _ = request("show")
+        assert exit_code == 0
+        assert "[X] tests.0001_initial" in stdout
+
+        # Docs are read again on every request
+        docs["tests.0002_testmodel_field2"]["_hash"] = "outdated_hash"
+        docs_file.write_text(yaml.safe_dump(docs))
+        exit_code, stdout, _ = request("check", "--fast")
+        assert exit_code == 1
+        assert "Found 1 stale migration doc(s)" in stdout
+
+        exit_code, _, stderr = request("check", "--invalid")
+        assert exit_code == 1
+        assert "unrecognized arguments: --invalid" in stderr
+
+        assert request("sync") == (
+            2,
+            "",
+            "django-migration-docs: The daemon only runs check and show.\n",
+        )
+    finally:
+        thread.join()
+
+    assert not os.path.exists(socket_path)
+    assert re.fullmatch(
+        f"django-migration-docs: Serving check and show on {re.escape(socket_path)}.\n"
+        'django-migration-docs: Ran "check" in \\d+ms.\n'
+        'django-migration-docs: Ran "show" in \\d+ms.\n'
+        'django-migration-docs: Ran "check --fast" in \\d+ms.\n'
+        'django-migration-docs: Ran "check --invalid" in \\d+ms.\n'
+        "django-migration-docs: Stopped after 1 second\\(s\\) without requests.\n",
+        capsys.readouterr().out,
+    )
@@ -0,0 +1,125 @@
+"""Unit tests for the profiling migration_docs module"""
+
+import json
+import os
+import pstats
+import threading
+
+import pytest
+from django.apps import apps
+
+from migration_docs import profiling
+
+
+def test_phase_without_profiler():
+    """Phases are no-ops when nothing is profiling"""
+    with profiling.phase("phase"):
+        pass
+
+    assert profiling._profiler is None
+    assert profiling.phased("phase")(lambda value: value)(1) == 1
+
+
+def test_profiler(tmp_path):
+    """Verifies the time and memory of phases are recorded"""
+
+    @profiling.phased("outer")
+    def outer():
+        with profiling.phase("inner"):
+            data = bytearray(1024 * 1024)
+            with profiling.phase("inner"):
+                pass
+
+        with profiling.phase("other"):
+            pass
+
+        return len(data)
+
+    pstats_path = tmp_path / "profile.pstats"
+    with profiling.Profiler(pstats_path=str(pstats_path)) as profiler:
+        assert outer() == 1024 * 1024
+        assert outer() == 1024 * 1024
+
+    assert profiling._profiler is None
+    assert list(profiler.phases) == ["inner", "other", "outer"]
+    assert profiler.phases["outer"]["calls"] == 2
+    assert profiler.phases["inner"]["calls"] == 2
+    assert profiler.phases["inner"]["peak_memory"] >= 1024 * 1024
+    assert profiler.phases["outer"]["peak_memory"] >= profiler.phases["inner"]["peak_memory"]
+    assert profiler.phases["other"]["peak_memory"] < 1024 * 1024
+    assert profiler.phases["outer"]["seconds"] >= profiler.phases["inner"]["seconds"]
+    assert pstats.Stats(str(pstats_path)).total_calls > 0
+
+    report = profiler.report().splitlines()
+    assert report[0].split() == ["Phase", "Calls", "Time", "Peak", "memory"]
+    assert report[1].split()[:2] == ["outer", "2"]
+    assert report[-2].startswith("total")
+    assert report[-1] == f"cProfile stats saved to {pstats_path}"
+
+
+@pytest.mark.parametrize(
+    "num_bytes, expected",
+    [(12, "12 B"), (2048, "2.0 KiB"), (3 * 1024**2, "3.0 MiB"), (1024**3, "1.0 GiB")],
+)
+def test_format_bytes(num_bytes, expected):
+    assert profiling._format_bytes(num_bytes) == expected
+
+
+def test_tracing(tmp_path):
+    """Verifies phases and spans are traced in the Chrome trace event format"""
+    with profiling.span("span"):
+        pass
+
+    trace_file = tmp_path / "trace-{pid}.json"
+    profiling.start_tracing(str(trace_file))
+    profiling.start_tracing(str(tmp_path / "ignored.json"))
+
+    def traced_thread():
+        with profiling.span("thread"):
+            pass
+
+    try:
+        with profiling.phase("outer", label="tests.0001_initial"):
+            with profiling.span("inner"):
+                thread = threading.Thread(target=traced_thread)
+                thread.start()
+                thread.join()
+    finally:
+        profiling.stop_tracing()
+
+    profiling.stop_tracing()
+    assert profiling._tracer is None
+    assert not (tmp_path / "ignored.json").exists()
+
+    with open(str(trace_file).format(pid=os.getpid())) as f:
+        trace = json.load(f)
+
+    events = {event["name"]: event for event in trace["traceEvents"]}
+    assert events["process_name"]["ph"] == "M"
+    assert set(events) == {"process_name", "outer", "inner", "thread"}
+    assert events["outer"]["ph"] == "X"
+    assert events["outer"]["args"] == {"label": "tests.0001_initial"}
+    assert "args" not in events["inner"]
+    assert events["outer"]["ts"] <= events["inner"]["ts"]
+    assert events["inner"]["dur"] <= events["outer"]["dur"]
+    assert events["outer"]["tid"] == threading.get_ident()
+    assert events["thread"]["tid"] != events["outer"]["tid"]
+
+
+@pytest.mark.parametrize("use_env", [True, False])
+def test_tracing_configured_on_ready(tmp_path, monkeypatch, settings, use_env):
+    """Tracing starts when the app is ready and a trace file is configured"""
+    trace_file = tmp_path / "trace.json"
+    if use_env:
+        monkeypatch.setenv("MIGRATION_DOCS_TRACE_FILE", str(trace_file))
+    else:
+        monkeypatch.delenv("MIGRATION_DOCS_TRACE_FILE", raising=False)
+        settings.MIGRATION_DOCS_TRACE_FILE = str(trace_file)
+
+    try:
+        apps.get_app_config("migration_docs").ready()
+        assert profiling._tracer.path == str(trace_file)
+    finally:
+        profiling.stop_tracing()
+
+    assert trace_file.exists()
@@ -0,0 +1,89 @@
+"""Unit tests for the utils migration_docs module"""
+
+import collections
+import copy
+
+import pytest
+
+from migration_docs import utils
+
+Element = collections.namedtuple("Element", ["name", "app", "tags"])
+
+
+@pytest.fixture
+def elements():
+    return utils.FilterableUserList(
+        [
+            Element("0001_initial", "users", ["a"]),
+            Element("0002_add_field", "users", ["b"]),
+            Element("0001_initial", "orders", ["a"]),
+            Element("0003_no_app", None, []),
+        ]
+    )
+
+
+def test_filterable_user_list_filter(elements):
+    """Verifies filtering with and without indexable attribute values"""
+    assert [e.app for e in elements.filter("name", "0001_initial")] == ["users", "orders"]
+    assert [e.name for e in elements.filter("app", "orders")] == ["0001_initial"]
+    assert not elements.filter("app", "missing")
+    assert [e.app for e in elements.filter("name", "^0001", match=True)] == ["users", "orders"]
+    assert [e.name for e in elements.filter("app", "^ord", match=True)] == ["0001_initial"]
+    assert [e.name for e in elements.filter("tags", ["a"])] == ["0001_initial", "0001_initial"]
+    assert [e.name for e in elements.filter("app", ["unhashable"])] == []
+
+    assert [e.name for e in elements.exclude("app", "users")] == ["0001_initial", "0003_no_app"]
+    assert [e.app for e in elements.exclude("name", "^0001", match=True)] == ["users", None]
+    assert [e.name for e in elements.exclude("tags", [])] == [
+        "0001_initial",
+        "0002_add_field",
+        "0001_initial",
+    ]
+    assert [e.name for e in elements.intersect("app", {"orders", None})] == [
+        "0001_initial",
+        "0003_no_app",
+    ]
+
+    # Filtering returns a copy with its own elements and indexes
+    filtered = elements.filter("app", "users")
+    assert isinstance(filtered, utils.FilterableUserList)
+    assert filtered.data is not elements.data
+    assert [e.name for e in filtered.filter("name", "0001_initial")] == ["0001_initial"]
+    assert len(elements.filter("name", "0001_initial")) == 2
+    assert copy.copy(elements) == elements
+
+
+def test_filterable_user_list_index_invalidation(elements):
+    """Verifies indexes are rebuilt when the list changes"""
+    assert len(elements.filter("app", "users")) == 2
+    assert "app" in elements._indexes
+
+    elements.append(Element("0003_remove_field", "users", []))
+    assert not elements._indexes
+    assert len(elements.filter("app", "users")) == 3
+
+    elements.pop(0)
+    assert len(elements.filter("app", "users")) == 2
+
+    elements[0] = Element("0002_add_field", "orders", [])
+    assert len(elements.filter("app", "users")) == 1
+
+    elements.data = []
+    assert not elements.filter("app", "users")
+
+
+def test_filterable_user_list_group(elements):
+    """Verifies grouping by indexed attribute values"""
+    groups = elements.group("app")
+    assert list(groups) == ["users", "orders", None]
+    assert [e.name for e in groups["users"]] == ["0001_initial", "0002_add_field"]
+
+    assert list(elements.group("app", ascending_keys=True)) == ["orders", "users", None]
+    assert list(elements.group("app", descending_keys=True, none_key_first=True)) == [
+        None,
+        "users",
+        "orders",
+    ]
+
+    with pytest.raises(TypeError, match="unhashable"):
+        elements.group("tags")
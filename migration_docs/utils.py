@@ -1,5 +1,6 @@
 import collections
 import copy
+import functools
 import re
 import subprocess
 
@@ -20,12 +21,100 @@ def _equals(a, b, match=False):
         return a == b
 
 
+def _invalidates_indexes(method):
+    """Wraps a method of a list that mutates it to clear its attribute indexes"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._indexes = {}
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class FilterableUserList(collections.UserList):
     """
     A collections.UserList that is filterable and groupable by the objects
     in the list.
+
+    The positions of elements are indexed by the values of their attributes
+    the first time an attribute is filtered or grouped on. Indexes are reused
+    until the list changes. Attributes with unhashable values are scanned
+    instead.
     """
 
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._indexes = {}
+
+    __setitem__ = _invalidates_indexes(collections.UserList.__setitem__)
+    __delitem__ = _invalidates_indexes(collections.UserList.__delitem__)
+    __iadd__ = _invalidates_indexes(collections.UserList.__iadd__)
+    __imul__ = _invalidates_indexes(collections.UserList.__imul__)
+    append = _invalidates_indexes(collections.UserList.append)
+    insert = _invalidates_indexes(collections.UserList.insert)
+    pop = _invalidates_indexes(collections.UserList.pop)
+    remove = _invalidates_indexes(collections.UserList.remove)
+    clear = _invalidates_indexes(collections.UserList.clear)
+    reverse = _invalidates_indexes(collections.UserList.reverse)
+    sort = _invalidates_indexes(collections.UserList.sort)
+    extend = _invalidates_indexes(collections.UserList.extend)
+
+    def __copy__(self):
+        inst = self.__class__.__new__(self.__class__)
+        inst.__dict__.update(self.__dict__)
+        inst.data = self.data[:]
+        return inst
+
+    def _index(self, attr):
+        """
+        Return a dictionary of attribute values mapped to the positions of
+        the elements with that value, or None if the values are unhashable.
+        """
+        if attr not in self._indexes:
+            index = collections.defaultdict(list)
+            try:
+                for position, element in enumerate(self.data):
+                    index[getattr(element, attr)].append(position)
+            except TypeError:
+                index = None
+
+            self._indexes[attr] = dict(index) if index is not None else None
+
+        return self._indexes[attr]
+
+    def _positions(self, attr, predicate):
+        """
+        Return the sorted positions of elements whose attribute values
+        satisfy a predicate. The predicate is evaluated once per distinct
+        value when the attribute is indexed.
+        """
+        index = self._index(attr)
+        if index is None:
+            return [
+                position
+                for position, element in enumerate(self.data)
+                if predicate(getattr(element, attr))
+            ]
+        else:
+            return sorted(
+                position
+                for value, positions in index.items()
+                if predicate(value)
+                for position in positions
+            )
+
+    def _copy(self, positions):
+        """Return a copy of the list object with the elements at the given positions"""
+        obj = copy.copy(self)
+        obj.data = [self.data[position] for position in positions]
+        return obj
+
     def filter(self, attr, value, match=False):
         """Filter elements by an attribute.
 
@@ -38,11 +127,19 @@ class FilterableUserList(collections.UserList):
         Returns:
             ``self.__class__``: A copy of the filtered list object.
         """
-        obj = copy.copy(self)
-        obj.data = [
-            element for element in self.data if _equals(getattr(element, attr), value, match=match)
-        ]
-        return obj
+        if match:
+            pattern = re.compile(value)
+            return self._copy(self._positions(attr, lambda a: _equals(a, pattern, match=True)))
+
+        index = self._index(attr)
+        if index is not None:
+            try:
+                return self._copy(index.get(value, []))
+            except TypeError:
+                # Unhashable values can't be looked up in the index
+                pass
+
+        return self._copy(self._positions(attr, lambda a: _equals(a, value)))
 
     def exclude(self, attr, value, match=False):
         """Exclude elements by an attribute.
@@ -56,13 +153,11 @@ class FilterableUserList(collections.UserList):
         Returns:
             ``self.__class__``: A copy of the excluded list object.
         """
-        obj = copy.copy(self)
-        obj.data = [
-            element
-            for element in self.data
-            if not _equals(getattr(element, attr), value, match=match)
-        ]
-        return obj
+        if match:
+            pattern = re.compile(value)
+            return self._copy(self._positions(attr, lambda a: not _equals(a, pattern, match=True)))
+        else:
+            return self._copy(self._positions(attr, lambda a: not _equals(a, value)))
 
     def intersect(self, attr, values):
         """Return elements whose attributes intersects a set of values.
@@ -74,9 +169,7 @@ class FilterableUserList(collections.UserList):
         Returns:
             ``self.__class__``: A copy of the filtered list object.
         """
-        obj = copy.copy(self)
-        obj.data = [element for element in self.data if getattr(element, attr) in values]
-        return obj
+        return self._copy(self._positions(attr, lambda a: a in values))
 
     def group(
         self,
@@ -106,9 +199,11 @@ class FilterableUserList(collections.UserList):
             none_key_last = True
 
         # Get the natural ordering of the keys
-        keys = list(
-            collections.OrderedDict((getattr(commit, attr), True) for commit in self).keys()
-        )
+        index = self._index(attr)
+        if index is None:
+            raise TypeError(f'Cannot group by "{attr}" since its values are unhashable.')
+
+        keys = list(index)
 
         # Re-sort the keys
         if any([ascending_keys, descending_keys]):
@@ -123,4 +218,4 @@ class FilterableUserList(collections.UserList):
             keys.remove(None)
             keys.insert(0 if none_key_first else len(keys), None)
 
-        return collections.OrderedDict((key, self.filter(attr, key)) for key in keys)
+        return collections.OrderedDict((key, self._copy(index[key])) for key in keys)
@@ -16,3 +16,6 @@ DATABASES = {"default": dj_database_url.config()}
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 USE_TZ = False
+
+# Always render SQL in tests unless a test enables the persistent SQL cache
+MIGRATION_DOCS_SQL_CACHE_SIZE = 0